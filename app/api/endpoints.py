@@ -1,13 +1,78 @@
+import re
+import math
+import orjson
+import time
+import hashlib
 import logging
-from fastapi import APIRouter, HTTPException, Depends
-from app.models.schemas import DiagramRequest, DiagramResponse, AssistantRequest, AssistantResponse
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse, FileResponse
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.cancellation import RequestCancelled, run_cancellable
+from app.models.schemas import DiagramRequest, DiagramResponse, RenderRequest, RenderOptions, AssistantRequest, AssistantResponse
 from app.services.llm_service import LLMService
 from app.services.diagram_service import DiagramService
-from app.services.diagram_tools import get_available_tools
+from app.services.tool_catalog import get_catalog
+from app.services.image_output import IMAGE_MEDIA_TYPES
+from app.services.image_store import get_image_store
+from app.services.render_sandbox import RenderError
+from app.services.render_queue import get_remote_renderer
+from app.services.warmup import is_ready, warmup_status
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+ENTITY_TAG_PATTERN = re.compile(r'(?:W/)?"([^"]*)"')
+
+def build_diagram_response(diagram_service: DiagramService, spec, options, message: str) -> DiagramResponse:
+    """Render the requested image variant (and thumbnail) into a response"""
+    options = options or RenderOptions()
+    if options.delivery == "url":
+        store = get_image_store()
+        image_url = f"/images/{store.put(diagram_service.render_image(spec, options), options.format)}"
+        thumbnail_url = None
+        if options.thumbnail:
+            thumbnail = diagram_service.render_thumbnail(spec, options)
+            thumbnail_url = f"/images/{store.put(thumbnail, options.format)}"
+        return DiagramResponse(
+            message=message,
+            format=options.format,
+            image_url=image_url,
+            thumbnail_url=thumbnail_url
+        )
+    
+    image_data = diagram_service.create_diagram_from_spec(spec, options)
+    thumbnail_data = diagram_service.create_thumbnail_from_spec(spec, options) if options.thumbnail else None
+    return DiagramResponse(
+        image_data=image_data,
+        message=message,
+        format=options.format,
+        thumbnail_data=thumbnail_data
+    )
+
+def wants_binary(http_request: Request) -> bool:
+    """Clients sending Accept: image/* get raw image bytes instead of base64 JSON"""
+    return http_request.headers.get("accept", "").startswith("image/")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check per RFC 9110: "*" or a list of tags, compared weakly (W/ ignored)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/").strip('"') in ENTITY_TAG_PATTERN.findall(if_none_match)
+
+def build_image_response(diagram_service: DiagramService, spec, options, message: str) -> Response:
+    """Return the rendered image as a binary body"""
+    options = options or RenderOptions()
+    image = diagram_service.render_image(spec, options)
+    return Response(
+        content=image,
+        media_type=IMAGE_MEDIA_TYPES[options.format],
+        headers={"X-Diagram-Message": message}
+    )
+
 # Dependency injection
 def get_llm_service() -> LLMService:
     return LLMService()
@@ -15,6 +80,13 @@ def get_llm_service() -> LLMService:
 def get_diagram_service() -> DiagramService:
     return DiagramService()
 
+def request_deadline() -> float:
+    """Monotonic time by which spec generation must finish, falling back to rules if the LLM would overrun.
+
+    Used as a dependency so the budget starts when the request arrives, not when the pipeline reaches the LLM.
+    """
+    return time.monotonic() + get_settings().request_deadline_seconds
+
 @router.get("/")
 async def root():
     return {"message": "Diagram API", "docs": "/docs"}
@@ -23,88 +95,242 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@router.get("/ready")
+async def ready():
+    """Readiness probe: not ready until startup warm-up has finished"""
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "not ready", **warmup_status})
+    return {"status": "ready", **warmup_status}
+
+@router.get("/render-workers")
+def render_workers():
+    """Queue depth and per-worker health as seen by the render broker"""
+    if get_settings().render_backend != "remote":
+        return {"backend": "local"}
+    try:
+        return {"backend": "remote", **get_remote_renderer().status()}
+    except RenderError as e:
+        return JSONResponse(status_code=e.status_code, content={"backend": "remote", "detail": str(e)})
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Process-local counters and histograms in Prometheus text format"""
+    return metrics.render()
+
+@router.get("/images/{digest}")
+async def get_image(digest: str, http_request: Request):
+    """Serve a stored image by content hash; the bytes never change, so it is cacheable forever"""
+    path = get_image_store().get_path(digest)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    # FileResponse handles Range/If-Range and uses zero-copy pathsend when the server supports it
+    return FileResponse(path, media_type=IMAGE_MEDIA_TYPES[path.rsplit(".", 1)[1]], headers=headers)
+
 @router.post("/generate-diagram", response_model=DiagramResponse)
 async def generate_diagram(
     request: DiagramRequest,
+    http_request: Request,
     llm_service: LLMService = Depends(get_llm_service),
-    diagram_service: DiagramService = Depends(get_diagram_service)
+    diagram_service: DiagramService = Depends(get_diagram_service),
+    deadline: float = Depends(request_deadline)
 ):
     """Generate a diagram from description using agent with tools"""
     logger.info(f"=== GENERATE DIAGRAM REQUEST ===")
     logger.info(f"Description: {request.description}")
     
-    try:
+    build_response = build_image_response if wants_binary(http_request) else build_diagram_response
+    
+    def pipeline():
         # Agent generates diagram specification using available tools
         logger.info("Step 1: Generating specification with LLM agent...")
-        spec = llm_service.generate_diagram_spec(request.description)
+        spec = llm_service.generate_diagram_spec(request.description, deadline)
         logger.info("Step 1: Specification generated successfully")
         
         # Create diagram from specification using parser
         logger.info("Step 2: Creating diagram from specification...")
-        image_data = diagram_service.create_diagram_from_spec(spec)
+        response = build_response(
+            diagram_service, spec, request.options, "Diagram generated successfully by agent"
+        )
         logger.info("Step 2: Diagram created successfully")
-        
+        return response
+    
+    try:
+        response = await run_cancellable(http_request, "generate_diagram", pipeline)
         logger.info("=== REQUEST COMPLETED SUCCESSFULLY ===")
-        return DiagramResponse(
-            image_data=image_data,
-            message="Diagram generated successfully by agent"
-        )
+        return response
+    except RequestCancelled as e:
+        logger.info(str(e))
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except RenderError as e:
+        logger.error(f"Diagram render rejected: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Diagram generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Diagram generation failed: {str(e)}")
 
+@router.post("/generate-diagram/stream")
+async def generate_diagram_stream(
+    request: DiagramRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+    diagram_service: DiagramService = Depends(get_diagram_service),
+    deadline: float = Depends(request_deadline)
+):
+    """Generate a diagram, streaming progress events as newline-delimited JSON"""
+    logger.info(f"=== GENERATE DIAGRAM STREAM REQUEST ===")
+    logger.info(f"Description: {request.description}")
+    
+    def event(name: str, **data) -> bytes:
+        return orjson.dumps({"event": name, **data}, option=orjson.OPT_APPEND_NEWLINE)
+    
+    async def events():
+        try:
+            yield event("status", message="Generating specification...")
+            spec = await run_cancellable(
+                http_request, "generate_diagram_stream",
+                llm_service.generate_diagram_spec, request.description, deadline
+            )
+            yield event("spec", specification=spec.model_dump(by_alias=True))
+            
+            yield event("status", message=f"Rendering {len(spec.nodes)} components...")
+            response = await run_cancellable(
+                http_request, "generate_diagram_stream",
+                build_diagram_response, diagram_service, spec, request.options, "Diagram generated successfully by agent"
+            )
+            yield event("image", **response.model_dump())
+        except RequestCancelled as e:
+            logger.info(str(e))
+        except RenderError as e:
+            logger.error(f"Streaming diagram render rejected: {e}")
+            yield event("error", detail=str(e), status_code=e.status_code)
+        except Exception as e:
+            logger.error(f"Streaming diagram generation failed: {e}")
+            yield event("error", detail=f"Diagram generation failed: {str(e)}")
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.post("/render-diagram", response_model=DiagramResponse)
+async def render_diagram(
+    request: RenderRequest,
+    http_request: Request,
+    diagram_service: DiagramService = Depends(get_diagram_service)
+):
+    """Render a diagram from an existing specification (overview or cluster drill-down)"""
+    logger.info(f"=== RENDER DIAGRAM REQUEST ===")
+    logger.info(f"Nodes: {len(request.spec.nodes)}, options: {request.options}")
+    
+    try:
+        build_response = build_image_response if wants_binary(http_request) else build_diagram_response
+        return await run_cancellable(
+            http_request, "render_diagram",
+            build_response, diagram_service, request.spec, request.options, "Diagram rendered successfully"
+        )
+    except RequestCancelled as e:
+        logger.info(str(e))
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except ValueError as e:
+        logger.error(f"Invalid render request: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except RenderError as e:
+        logger.error(f"Diagram render rejected: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error(f"Diagram rendering failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Diagram rendering failed: {str(e)}")
+
 @router.post("/debug-spec")
 async def debug_spec(
     request: DiagramRequest,
-    llm_service: LLMService = Depends(get_llm_service)
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+    deadline: float = Depends(request_deadline)
 ):
     """Debug endpoint to see what specification the agent generates"""
     try:
-        spec = llm_service.generate_diagram_spec(request.description)
+        spec = await run_cancellable(
+            http_request, "debug_spec",
+            llm_service.generate_diagram_spec, request.description, deadline
+        )
         return {"specification": spec.model_dump()}
+    except RequestCancelled as e:
+        logger.info(str(e))
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         logger.error(f"Debug spec failed: {e}")
         raise HTTPException(status_code=500, detail=f"Debug spec failed: {str(e)}")
 
 @router.get("/tools")
-async def get_tools():
-    """Get available diagram tools"""
-    tools = get_available_tools()
-    return {
-        "total_tools": len(tools),
-        "tools": tools,
-        "by_provider": {
-            "aws": {k: v for k, v in tools.items() if k.startswith("aws.")},
-            "gcp": {k: v for k, v in tools.items() if k.startswith("gcp.")},
-            "azure": {k: v for k, v in tools.items() if k.startswith("azure.")}
-        }
-    }
+async def get_tools(
+    http_request: Request,
+    q: Optional[str] = None,
+    provider: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=500)
+):
+    """Search and page through the diagram tool catalog"""
+    catalog = get_catalog()
+    etag = '"' + hashlib.sha256(
+        f"{catalog.etag}|{q}|{provider}|{page}|{page_size}".encode()
+    ).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    entries = catalog.search(q, provider=provider) if q else catalog.filter(provider)
+    start = (page - 1) * page_size
+    page_entries = entries[start:start + page_size]
+    
+    tools = {e["type"]: e["description"] for e in page_entries}
+    by_provider = {"aws": {}, "gcp": {}, "azure": {}}
+    for e in page_entries:
+        by_provider.setdefault(e["provider"], {})[e["type"]] = e["description"]
+    
+    return Response(
+        content=orjson.dumps({
+            "total_tools": len(entries),
+            "page": page,
+            "page_size": page_size,
+            "total_pages": math.ceil(len(entries) / page_size),
+            "tools": tools,
+            "by_provider": by_provider
+        }),
+        media_type="application/json",
+        headers=headers
+    )
 
 @router.post("/assistant", response_model=AssistantResponse)
 async def assistant(
     request: AssistantRequest,
+    http_request: Request,
     llm_service: LLMService = Depends(get_llm_service),
-    diagram_service: DiagramService = Depends(get_diagram_service)
+    diagram_service: DiagramService = Depends(get_diagram_service),
+    deadline: float = Depends(request_deadline)
 ):
     """Assistant-style endpoint that understands user intent and responds helpfully"""
     logger.info(f"=== ASSISTANT REQUEST ===")
     logger.info(f"Message: {request.message}")
     logger.info(f"Context: {request.context}")
     
-    try:
+    def pipeline():
         # Use LLM to understand user intent
-        response = llm_service.process_assistant_request(request.message, request.context)
+        response = llm_service.process_assistant_request(request.message, request.context, deadline)
         
         # If the response indicates diagram generation is needed
         if response.get("action") == "generate_diagram":
             logger.info("Assistant determined diagram generation is needed")
-            spec = llm_service.generate_diagram_spec(response["description"])
-            image_data = diagram_service.create_diagram_from_spec(spec)
+            spec = llm_service.generate_diagram_spec(response["description"], deadline)
+            diagram = build_diagram_response(diagram_service, spec, request.options, response["response"])
             
             return AssistantResponse(
                 response=response["response"],
                 action="diagram_generated",
-                image_data=image_data
+                image_data=diagram.image_data,
+                image_url=diagram.image_url
             )
         else:
             # Just return the conversational response
@@ -112,7 +338,15 @@ async def assistant(
                 response=response["response"],
                 action=response.get("action")
             )
-            
+    
+    try:
+        return await run_cancellable(http_request, "assistant", pipeline)
+    except RequestCancelled as e:
+        logger.info(str(e))
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except RenderError as e:
+        logger.error(f"Assistant diagram render rejected: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Assistant error: {e}")
-        raise HTTPException(status_code=500, detail=f"Assistant error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Assistant error: {str(e)}")
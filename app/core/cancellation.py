@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from app.core.metrics import metrics
+
+# How often a waiting endpoint checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.25
+
+class RequestCancelled(Exception):
+    """The client went away; raised inside the pipeline to stop LLM calls and renders"""
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+class SharedCancelToken:
+    """Token for work shared by several requests: cancelled only once every member is"""
+
+    def __init__(self, token: Optional[CancelToken]):
+        self._lock = threading.Lock()
+        self._members = [token]
+
+    def add(self, token: Optional[CancelToken]) -> None:
+        with self._lock:
+            self._members.append(token)
+
+    @property
+    def waiters(self) -> int:
+        return len(self._members)
+
+    @property
+    def cancelled(self) -> bool:
+        # A member without a token (warm-up, scripts) can never cancel
+        with self._lock:
+            return all(member is not None and member.cancelled for member in self._members)
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+_current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("endpoint", default="internal")
+
+def current_token() -> Optional[CancelToken]:
+    """Token of the request being served by this thread, if it can be cancelled"""
+    return _current_token.get()
+
+def current_endpoint() -> str:
+    """Endpoint whose pipeline is running in this thread, for metric labels"""
+    return _current_endpoint.get()
+
+@contextmanager
+def use_token(token):
+    """Run the enclosed work under a different cancel token"""
+    reset = _current_token.set(token)
+    try:
+        yield
+    finally:
+        _current_token.reset(reset)
+
+def raise_if_cancelled(stage: str) -> None:
+    token = current_token()
+    if token is not None and token.cancelled:
+        metrics.inc("requests_cancelled_total", {"stage": stage})
+        raise RequestCancelled(f"Request cancelled during {stage}")
+
+async def run_cancellable(http_request: Request, endpoint: str, func, *args):
+    """Run blocking pipeline work in the threadpool, cancelling it if the client disconnects"""
+    token = CancelToken()
+
+    def call():
+        _current_token.set(token)
+        _current_endpoint.set(endpoint)
+        return func(*args)
+
+    task = asyncio.ensure_future(run_in_threadpool(call))
+    # The abandoned task raises RequestCancelled after a disconnect; nobody awaits it
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        # Streaming responses are cancelled by the server when the client disconnects
+        token.cancel()
+        metrics.inc("client_disconnects_total", {"endpoint": endpoint})
+        raise
+    token.cancel()
+    metrics.inc("client_disconnects_total", {"endpoint": endpoint})
+    raise RequestCancelled(f"Client disconnected from {endpoint}")
+
+@contextmanager
+def interrupt_on_cancel(interrupt, stage: str):
+    """Call interrupt() from a watchdog thread if the request is cancelled while the enclosed code blocks.
+
+    For reads that never return to check the token themselves, e.g. an LLM stream waiting for its first chunk.
+    """
+    token = current_token()
+    if token is None:
+        yield
+        return
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(DISCONNECT_POLL_SECONDS):
+            if token.cancelled:
+                interrupt()
+                return
+
+    threading.Thread(target=watch, name=f"interrupt-{stage}", daemon=True).start()
+    try:
+        yield
+    finally:
+        done.set()
@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from functools import lru_cache
 
 # Load environment variables
@@ -14,15 +15,107 @@ class Settings:
     # OpenRouter Configuration
     openrouter_api_key: str = os.getenv("OPENROUTER_API_KEY", "")
     openrouter_model: str = os.getenv("OPENROUTER_MODEL", "anthropic/claude-3.5-sonnet")
+    openrouter_fast_model: str = os.getenv("OPENROUTER_FAST_MODEL", "anthropic/claude-3.5-haiku")
+    
+    # Model Routing Configuration
+    model_routing_enabled: bool = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+    routing_fast_max_score: float = float(os.getenv("ROUTING_FAST_MAX_SCORE", "12"))
+    spec_base_tokens: int = int(os.getenv("SPEC_BASE_TOKENS", "400"))
+    spec_tokens_per_component: int = int(os.getenv("SPEC_TOKENS_PER_COMPONENT", "90"))
+    spec_tokens_per_cluster: int = int(os.getenv("SPEC_TOKENS_PER_CLUSTER", "120"))
+    spec_min_tokens: int = int(os.getenv("SPEC_MIN_TOKENS", "800"))
+    spec_max_tokens: int = int(os.getenv("SPEC_MAX_TOKENS", "4000"))
     
     # Server Configuration
     host: str = os.getenv("HOST", "0.0.0.0")
     port: int = int(os.getenv("PORT", "8000"))
     debug: bool = os.getenv("DEBUG", "false").lower() == "true"
+    workers: int = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))
+    warmup_enabled: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
     
     # Logging Configuration
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     
+    # Layout Configuration
+    layout_bounded_dot_nodes: int = int(os.getenv("LAYOUT_BOUNDED_DOT_NODES", "40"))
+    layout_neato_nodes: int = int(os.getenv("LAYOUT_NEATO_NODES", "150"))
+    layout_sfdp_nodes: int = int(os.getenv("LAYOUT_SFDP_NODES", "400"))
+    layout_dense_edge_ratio: float = float(os.getenv("LAYOUT_DENSE_EDGE_RATIO", "2.0"))
+    layout_nslimit: str = os.getenv("LAYOUT_NSLIMIT", "2.0")
+    layout_mclimit: str = os.getenv("LAYOUT_MCLIMIT", "0.5")
+    # Cached node/edge coordinates per topology, reused with neato -n2 on label-only edits
+    layout_cache_enabled: bool = os.getenv("LAYOUT_CACHE_ENABLED", "true").lower() == "true"
+    layout_cache_max_bytes: int = int(os.getenv("LAYOUT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    
+    # Icon Asset Configuration (icons pre-scaled per DPI, kept in RAM-backed /dev/shm when available)
+    icon_cache_enabled: bool = os.getenv("ICON_CACHE_ENABLED", "true").lower() == "true"
+    icon_cache_dir: str = os.getenv(
+        "ICON_CACHE_DIR",
+        os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "diagram-api-icons")
+    )
+    icon_cache_dpis: list = [int(dpi) for dpi in os.getenv("ICON_CACHE_DPIS", "96,150,300").split(",")]
+    
+    # Level-of-detail Configuration
+    lod_node_budget: int = int(os.getenv("LOD_NODE_BUDGET", "200"))
+    
+    # Render Sandbox Configuration
+    render_sandbox_enabled: bool = os.getenv("RENDER_SANDBOX_ENABLED", "true").lower() == "true"
+    # Machine-wide budget, split between the API worker processes (see render_pool_size)
+    render_workers: int = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+    render_timeout_seconds: float = float(os.getenv("RENDER_TIMEOUT_SECONDS", "30"))
+    render_cpu_seconds: int = int(os.getenv("RENDER_CPU_SECONDS", "20"))
+    render_memory_limit_mb: int = int(os.getenv("RENDER_MEMORY_LIMIT_MB", "2048"))
+    render_worker_max_jobs: int = int(os.getenv("RENDER_WORKER_MAX_JOBS", "200"))
+    render_worker_max_rss_mb: int = int(os.getenv("RENDER_WORKER_MAX_RSS_MB", "512"))
+    # Limits on the spec as rendered (after level of detail) and hard caps on the spec as sent
+    max_spec_nodes: int = int(os.getenv("MAX_SPEC_NODES", "2000"))
+    max_spec_edges: int = int(os.getenv("MAX_SPEC_EDGES", "5000"))
+    max_raw_spec_nodes: int = int(os.getenv("MAX_RAW_SPEC_NODES", "50000"))
+    max_raw_spec_edges: int = int(os.getenv("MAX_RAW_SPEC_EDGES", "100000"))
+    max_label_length: int = int(os.getenv("MAX_LABEL_LENGTH", "200"))
+    
+    # Remote Render Worker Configuration ("local" renders in this process, "remote" via the broker)
+    render_backend: str = os.getenv("RENDER_BACKEND", "local")
+    render_broker_host: str = os.getenv("RENDER_BROKER_HOST", "127.0.0.1")
+    render_broker_port: int = int(os.getenv("RENDER_BROKER_PORT", "8790"))
+    render_broker_embedded: bool = os.getenv("RENDER_BROKER_EMBEDDED", "true").lower() == "true"
+    # Shared secret every client and worker sends on connect; required off loopback
+    render_broker_token: str = os.getenv("RENDER_BROKER_TOKEN", "")
+    render_heartbeat_seconds: float = float(os.getenv("RENDER_HEARTBEAT_SECONDS", "2"))
+    render_worker_timeout_seconds: float = float(os.getenv("RENDER_WORKER_TIMEOUT_SECONDS", "10"))
+    render_job_max_attempts: int = int(os.getenv("RENDER_JOB_MAX_ATTEMPTS", "3"))
+    render_job_timeout_seconds: float = float(os.getenv("RENDER_JOB_TIMEOUT_SECONDS", "120"))
+    
+    # Output Configuration
+    thumbnail_width: int = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+    webp_lossless: bool = os.getenv("WEBP_LOSSLESS", "true").lower() == "true"
+    webp_quality: int = int(os.getenv("WEBP_QUALITY", "90"))
+    
+    # Cache Configuration
+    cache_backend: str = os.getenv("CACHE_BACKEND", "sqlite")
+    cache_db_path: str = os.getenv("CACHE_DB_PATH", os.path.join(tempfile.gettempdir(), "diagram-api-cache.sqlite3"))
+    render_cache_max_bytes: int = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    spec_cache_max_bytes: int = int(os.getenv("SPEC_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+    spec_cache_ttl_seconds: int = int(os.getenv("SPEC_CACHE_TTL_SECONDS", "3600"))
+    
+    # Fallback Configuration
+    rule_fast_path_enabled: bool = os.getenv("RULE_FAST_PATH_ENABLED", "true").lower() == "true"
+    rule_fast_path_confidence: float = float(os.getenv("RULE_FAST_PATH_CONFIDENCE", "0.9"))
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    llm_min_budget_seconds: float = float(os.getenv("LLM_MIN_BUDGET_SECONDS", "3"))
+    request_deadline_seconds: float = float(os.getenv("REQUEST_DEADLINE_SECONDS", "90"))
+    circuit_failure_threshold: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    circuit_reset_seconds: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    
+    # Image Store Configuration (content-addressed files served at /images/{sha256})
+    image_store_path: str = os.getenv("IMAGE_STORE_PATH", os.path.join(tempfile.gettempdir(), "diagram-api-images"))
+    image_store_max_bytes: int = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+    
+    # Tool Catalog Configuration
+    tool_catalog_path: str = os.getenv("TOOL_CATALOG_PATH", os.path.join(tempfile.gettempdir(), "diagram-api-tools.json"))
+    # Total node types in the agent prompt: the curated tools plus the best catalog matches
+    prompt_tool_top_k: int = int(os.getenv("PROMPT_TOOL_TOP_K", "72"))
+    
     # Application Configuration
     app_name: str = "Diagram API"
     app_version: str = "1.0.0"
@@ -30,6 +123,12 @@ class Settings:
     @property
     def is_openrouter_configured(self) -> bool:
         return bool(self.openrouter_api_key)
+    
+    @property
+    def render_pool_size(self) -> int:
+        """Sandbox processes per API process, so all workers together stay within RENDER_WORKERS"""
+        processes = 1 if self.debug else max(1, self.workers)
+        return max(1, self.render_workers // processes)
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,59 @@
+import threading
+from collections import defaultdict
+from typing import Optional
+
+# Histogram buckets in seconds, tuned for LLM calls and Graphviz renders
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+def _label_key(labels: Optional[dict]) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+def _format_labels(key: tuple, extra: Optional[dict] = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Metrics:
+    """Minimal in-process counters and histograms in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name: str, labels: Optional[dict] = None, value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        with self._lock:
+            key = (name, _label_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def get(self, name: str, labels: Optional[dict] = None) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0.0)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, key), value in sorted(self._counters.items()):
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for (name, key), histogram in sorted(self._histograms.items()):
+                for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram['sum']:g}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
\ No newline at end of file
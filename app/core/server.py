@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import importlib
+from collections import deque
+from typing import Callable, Optional
+import uvicorn
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is respawned with exponential backoff
+MIN_UPTIME_SECONDS = 10.0
+RESPAWN_BACKOFF_SECONDS = 0.5
+MAX_RESPAWN_BACKOFF_SECONDS = 30.0
+# More worker exits than this within the window stops the server instead of respawning forever
+CRASH_LIMIT = 10
+CRASH_WINDOW_SECONDS = 60.0
+
+def preload_modules():
+    """Import heavy dependencies once so forked workers share them copy-on-write"""
+    for module in ("diagrams", "openai", "PIL.Image"):
+        importlib.import_module(module)
+    from app.services.diagram_tools import import_tool_modules
+    from app.services.tool_catalog import get_catalog
+    import_tool_modules()
+    get_catalog()
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, sock: socket.socket) -> None:
+    settings = get_settings()
+    config = uvicorn.Config(app, log_level=settings.log_level.lower())
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+def serve_prefork(app, host: str, port: int, workers: int, start_broker: Optional[Callable] = None) -> None:
+    """Preload the application, then fork workers that share one listening socket.
+
+    start_broker, if given, starts the render broker process; it is restarted like a worker when it dies.
+    """
+    preload_modules()
+    sock = _bind_socket(host, port)
+    # pid -> (start time, function that starts a replacement and returns its pid)
+    children = {}
+    respawn_at = []
+    crashes = deque()
+    backoff = 0.0
+    stopping = False
+    failed = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                _run_worker(app, sock)
+            finally:
+                os._exit(0)
+        children[pid] = (time.monotonic(), spawn)
+        logger.info(f"Started worker {pid}")
+        return pid
+
+    def spawn_broker():
+        pid = start_broker().pid
+        children[pid] = (time.monotonic(), spawn_broker)
+        return pid
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info(f"Pre-fork server on {host}:{port} with {workers} workers")
+    if start_broker is not None:
+        spawn_broker()
+    for _ in range(workers):
+        spawn()
+
+    while children or (respawn_at and not stopping):
+        if respawn_at and not stopping and respawn_at[0][0] <= time.monotonic():
+            _, start = respawn_at.pop(0)
+            start()
+            continue
+        try:
+            # Block while nothing is waiting to be respawned, otherwise poll
+            pid, status = os.waitpid(-1, os.WNOHANG if respawn_at else 0)
+        except ChildProcessError:
+            pid = 0
+        except InterruptedError:
+            continue
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        if pid not in children:
+            logger.warning(f"Process {pid} exited with status {status}")
+            continue
+        started, start = children.pop(pid)
+        uptime = time.monotonic() - started
+        name = "Render broker" if start is spawn_broker else "Worker"
+        if stopping:
+            continue
+
+        now = time.monotonic()
+        crashes.append(now)
+        while crashes[0] < now - CRASH_WINDOW_SECONDS:
+            crashes.popleft()
+        if len(crashes) > CRASH_LIMIT:
+            logger.error(f"{len(crashes)} process exits in {CRASH_WINDOW_SECONDS:g}s, shutting down")
+            failed = True
+            stop(None, None)
+            continue
+
+        if uptime >= MIN_UPTIME_SECONDS:
+            backoff = 0.0
+        else:
+            backoff = min(MAX_RESPAWN_BACKOFF_SECONDS, max(RESPAWN_BACKOFF_SECONDS, backoff * 2))
+        logger.warning(f"{name} {pid} exited with status {status} after {uptime:.1f}s, restarting in {backoff:g}s")
+        respawn_at.append((now + backoff, start))
+        respawn_at.sort(key=lambda entry: entry[0])
+
+    sock.close()
+    logger.info("All workers stopped")
+    if failed:
+        sys.exit(1)
@@ -1,43 +1,83 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Dict, Any, Literal
+
+# Specs are never mutated (variants go through model_copy), so freeze them. They come from
+# LLM output, so validation stays lax: "show": "false" and numeric ids are accepted
+SPEC_CONFIG = ConfigDict(frozen=True, coerce_numbers_to_str=True)
+
+class RenderOptions(BaseModel):
+    # Options come from API clients, not the LLM, so they are validated strictly
+    model_config = ConfigDict(strict=True, frozen=True)
+    
+    layout: Optional[Literal["dot", "neato", "sfdp"]] = None
+    detail: Literal["auto", "full", "overview"] = "auto"
+    focus_cluster: Optional[str] = None
+    dpi: Optional[int] = Field(default=None, ge=36, le=600)
+    width: Optional[int] = Field(default=None, ge=16, le=8192)
+    format: Literal["png", "webp"] = "png"
+    optimize: bool = False
+    thumbnail: bool = False
+    delivery: Literal["inline", "url"] = "inline"
 
 class DiagramRequest(BaseModel):
     description: str
+    options: Optional[RenderOptions] = None
 
 class DiagramResponse(BaseModel):
-    image_data: str
+    image_data: Optional[str] = None
     message: str
+    format: str = "png"
+    thumbnail_data: Optional[str] = None
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
 
 class NodeSpec(BaseModel):
+    model_config = SPEC_CONFIG
+    
     id: str
     type: str
     label: str
 
 class ClusterSpec(BaseModel):
+    model_config = SPEC_CONFIG
+    
     id: str
     name: str
     nodes: List[str]
 
 class EdgeSpec(BaseModel):
+    model_config = SPEC_CONFIG
+    
     from_: str = Field(alias="from")
     to: str
+    label: Optional[str] = None
 
 class DiagramConfig(BaseModel):
+    model_config = SPEC_CONFIG
+    
     name: str
     filename: str = "diagram"
     show: bool = False
 
 class DiagramSpec(BaseModel):
+    model_config = SPEC_CONFIG
+    
     diagram: DiagramConfig
     nodes: List[NodeSpec]
     clusters: List[ClusterSpec] = []
     edges: List[EdgeSpec] = []
 
+class RenderRequest(BaseModel):
+    spec: DiagramSpec
+    options: Optional[RenderOptions] = None
+
 class AssistantRequest(BaseModel):
     message: str
     context: Optional[str] = None
+    options: Optional[RenderOptions] = None
 
 class AssistantResponse(BaseModel):
     response: str
     action: Optional[str] = None
-    image_data: Optional[str] = None
\ No newline at end of file
+    image_data: Optional[str] = None
+    image_url: Optional[str] = None
\ No newline at end of file
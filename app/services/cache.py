@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec
+
+logger = logging.getLogger(__name__)
+
+def spec_hash(spec: DiagramSpec) -> str:
+    """Stable hash of a diagram specification"""
+    return hashlib.sha256(spec.model_dump_json(by_alias=True).encode()).hexdigest()
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache for bytes, bounded by total size"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                self._size -= len(value)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            logger.debug(f"Not caching {key}: {len(value)} bytes exceeds cache size")
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (value, time.time())
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+class SQLiteCache:
+    """Size-bounded LRU cache in a local SQLite file, shared by all worker processes"""
+
+    def __init__(self, path: str, namespace: str, max_bytes: int, ttl_seconds: Optional[int] = None):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross fork(), so keep one per process and thread
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            now = time.time()
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return None
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            return value
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed ({self.namespace}): {e}")
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            logger.debug(f"Not caching {key}: {len(value)} bytes exceeds cache size")
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, value, len(value), now, now)
+            )
+            self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache write failed ({self.namespace}): {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        rows = conn.execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY accessed_at", (self.namespace,)
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((self.namespace, key))
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", evicted)
+        logger.debug(f"Evicted {len(evicted)} entries from {self.namespace} cache")
+
+def get_cache(namespace: str, max_bytes: int, ttl_seconds: Optional[int] = None):
+    """Create a cache for the configured backend (sqlite is shared across workers)"""
+    settings = get_settings()
+    if settings.cache_backend == "sqlite":
+        return SQLiteCache(settings.cache_db_path, namespace, max_bytes, ttl_seconds)
+    return LRUCache(max_bytes, ttl_seconds)
\ No newline at end of file
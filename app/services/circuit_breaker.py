@@ -0,0 +1,41 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Stops calling a failing upstream for a cool-down period after repeated errors"""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Open while cooling down; after the timeout one trial call is let through"""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Half-open: allow a trial call, re-open immediately if it fails
+                self._opened_at = None
+                self._failures = self.failure_threshold - 1
+                return False
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
\ No newline at end of file
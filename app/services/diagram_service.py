@@ -4,24 +4,125 @@ import base64
 import tempfile
 import importlib
 import logging
-from diagrams import Diagram, Cluster
-from app.models.schemas import DiagramSpec
+from diagrams import Cluster, Edge
+from typing import Optional
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.cancellation import raise_if_cancelled
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.cache import get_cache, spec_hash
+from app.services.image_output import convert_image, needs_conversion
+from app.services.layout import select_layout
+from app.services.icon_assets import DEFAULT_DPI, scaled_icon
+from app.services.layout_cache import (
+    PositionedDiagram, layout_cache, topology_hash, extract_positions,
+    positioned_graph_attr, cluster_attr, node_attr, edge_attr
+)
+from app.services.level_of_detail import apply_level_of_detail
+from app.services.render_sandbox import check_input_limits, get_render_sandbox
+from app.services.render_queue import get_remote_renderer
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Options that change the Graphviz output itself; the rest are applied afterwards
+RENDER_OPTION_FIELDS = {"layout", "detail", "focus_cluster", "dpi"}
+
+# Shared across requests (and workers with the sqlite backend)
+render_cache = get_cache("render", get_settings().render_cache_max_bytes)
+render_flight = SingleFlight("render")
+
 class DiagramService:
     def __init__(self):
         logger.info("DiagramService initialized")
     
-    def get_node_instance(self, type_path: str, label: str):
-        """Create a node instance from type path"""
+    def get_node_instance(self, type_path: str, label: str, node_id: Optional[str] = None,
+                          icon_dpi: Optional[int] = None, **attrs):
+        """Create a node instance from type path, pointing it at a pre-scaled icon when icon_dpi is set"""
         provider, module, cls_name = type_path.split(".")
         mod = importlib.import_module(f"diagrams.{provider}.{module}")
         cls = getattr(mod, cls_name)
-        return cls(label)
+        if icon_dpi and cls._icon:
+            attrs["image"] = scaled_icon(cls, icon_dpi)
+        return cls(label, nodeid=node_id, **attrs)
+    
+    def create_diagram_from_spec(self, spec: DiagramSpec, options: Optional[RenderOptions] = None) -> str:
+        """Create diagram from JSON specification and return it base64 encoded"""
+        image_data = base64.b64encode(self.render_image(spec, options)).decode()
+        logger.info(f"Encoded image to base64, length: {len(image_data)}")
+        return image_data
+    
+    def create_thumbnail_from_spec(self, spec: DiagramSpec, options: Optional[RenderOptions] = None) -> str:
+        """Create a small preview of the diagram, reusing the full-size render"""
+        return base64.b64encode(self.render_thumbnail(spec, options)).decode()
     
-    def create_diagram_from_spec(self, spec: DiagramSpec) -> str:
-        """Create diagram from JSON specification using the parser"""
+    def render_thumbnail(self, spec: DiagramSpec, options: Optional[RenderOptions] = None) -> bytes:
+        """Thumbnail image bytes, derived from the cached full-size render"""
+        options = options or RenderOptions()
+        thumbnail_options = options.model_copy(update={
+            "width": get_settings().thumbnail_width,
+            "optimize": True,
+            "thumbnail": False
+        })
+        return self.render_image(spec, thumbnail_options)
+    
+    def render_image(self, spec: DiagramSpec, options: Optional[RenderOptions] = None, use_cache: bool = True) -> bytes:
+        """Render diagram image bytes, caching both the Graphviz output and each variant"""
+        options = options or RenderOptions()
+        check_input_limits(spec, options)
+        if not use_cache:
+            return convert_image(self._run_graphviz(spec, options), options)
+        
+        digest = spec_hash(spec)
+        render_key = f"render:{digest}:{options.model_dump_json(include=RENDER_OPTION_FIELDS)}"
+        # Plain PNG output is the Graphviz render itself; only real variants get their own entry
+        variant_key = None
+        if needs_conversion(options):
+            variant_key = f"variant:{digest}:{options.model_dump_json(exclude={'thumbnail', 'delivery'})}"
+            image = render_cache.get(variant_key)
+            if image is not None:
+                logger.info(f"Render cache hit for variant {variant_key[:80]}")
+                return image
+        
+        png = render_cache.get(render_key)
+        if png is None:
+            # Concurrent requests for the same spec and layout share one Graphviz run
+            png = render_flight.do(render_key, lambda: self._render_and_cache(render_key, spec, options))
+        else:
+            logger.info("Render cache hit, skipping Graphviz")
+        
+        if variant_key is None:
+            return png
+        image = convert_image(png, options)
+        render_cache.set(variant_key, image)
+        return image
+    
+    def _render_and_cache(self, render_key: str, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        """Render on a cache miss; runs once per in-flight spec and layout"""
+        # A flight that finished just before this one started has already filled the cache
+        png = render_cache.get(render_key)
+        if png is not None:
+            return png
+        png = self._run_graphviz(spec, options)
+        render_cache.set(render_key, png)
+        return png
+    
+    def _run_graphviz(self, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        """Render on a remote worker or locally, depending on the configured backend"""
+        raise_if_cancelled("render")
+        if get_settings().render_backend == "remote":
+            return get_remote_renderer().render(spec, options)
+        return self.render_local(spec, options)
+    
+    def render_local(self, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        """Render in the resource-limited sandbox unless it is disabled"""
+        if get_settings().render_sandbox_enabled:
+            return get_render_sandbox().render(spec, options)
+        return self._render_png(spec, options)
+    
+    def _render_png(self, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        """Run Graphviz on the specification and return the PNG bytes"""
+        spec = apply_level_of_detail(spec, options)
         logger.info("Creating diagram from specification...")
         logger.info(f"Diagram name: {spec.diagram.name}")
         logger.info(f"Nodes count: {len(spec.nodes)}")
@@ -29,19 +130,39 @@ class DiagramService:
         logger.info(f"Edges count: {len(spec.edges)}")
         
         with tempfile.TemporaryDirectory() as temp_dir:
-            diagram_path = os.path.join(temp_dir, spec.diagram.filename)
+            # spec.diagram.filename comes from the client or the LLM; never let it pick the path
+            diagram_path = os.path.join(temp_dir, "diagram")
             logger.info(f"Diagram path: {diagram_path}")
             
             nodes_spec = {n.id: n for n in spec.nodes}
             clusters_spec = {c.id: c for c in spec.clusters}
+            layout = select_layout(spec, options.layout)
+            graph_attr = dict(layout["graph_attr"])
+            if options.dpi:
+                graph_attr["dpi"] = str(options.dpi)
+            
+            # Same topology as an earlier render: reuse its coordinates and skip layout
+            topology = topology_hash(spec, graph_attr)
+            positions = None
+            if get_settings().layout_cache_enabled:
+                cached_layout = layout_cache.get(topology)
+                positions = json.loads(cached_layout) if cached_layout is not None else None
+                metrics.inc("layout_cache_total", {"result": "miss" if positions is None else "hit"})
+            if positions is not None:
+                logger.info("Layout cache hit, rendering with fixed positions")
+                graph_attr.update(positioned_graph_attr(positions))
+            
+            icon_dpi = (options.dpi or DEFAULT_DPI) if get_settings().icon_cache_enabled else None
             
             logger.info("Creating Diagram object...")
-            with Diagram(
+            with PositionedDiagram(
                 spec.diagram.name,
                 filename=diagram_path,
                 outformat="png",
-                show=spec.diagram.show
-            ):
+                show=False,
+                graph_attr=graph_attr,
+                positions=positions
+            ) as diagram:
                 node_instances = {}
                 rendered_nodes = set()
 
@@ -49,11 +170,13 @@ class DiagramService:
                 logger.info("Rendering clusters...")
                 for cluster in clusters_spec.values():
                     logger.info(f"Rendering cluster: {cluster.name}")
-                    with Cluster(cluster.name):
+                    with Cluster(cluster.name, graph_attr=cluster_attr(positions, cluster.id)):
                         for node_id in cluster.nodes:
                             node_data = nodes_spec[node_id]
-                            logger.info(f"Creating node: {node_id} ({node_data.type})")
-                            instance = self.get_node_instance(node_data.type, node_data.label)
+                            logger.debug(f"Creating node: {node_id} ({node_data.type})")
+                            instance = self.get_node_instance(
+                                node_data.type, node_data.label, node_id, icon_dpi, **node_attr(positions, node_id)
+                            )
                             node_instances[node_id] = instance
                             rendered_nodes.add(node_id)
 
@@ -61,15 +184,35 @@ class DiagramService:
                 logger.info("Rendering standalone nodes...")
                 for node_id, node_data in nodes_spec.items():
                     if node_id not in rendered_nodes:
-                        logger.info(f"Creating standalone node: {node_id} ({node_data.type})")
-                        instance = self.get_node_instance(node_data.type, node_data.label)
+                        logger.debug(f"Creating standalone node: {node_id} ({node_data.type})")
+                        instance = self.get_node_instance(
+                            node_data.type, node_data.label, node_id, icon_dpi, **node_attr(positions, node_id)
+                        )
                         node_instances[node_id] = instance
 
-                # Render edges
+                # Render edges, merging duplicates
                 logger.info("Rendering edges...")
+                rendered_edges = set()
                 for edge in spec.edges:
-                    logger.info(f"Creating edge: {edge.from_} -> {edge.to}")
-                    node_instances[edge.from_] >> node_instances[edge.to]
+                    if (edge.from_, edge.to) in rendered_edges:
+                        logger.debug(f"Skipping duplicate edge: {edge.from_} -> {edge.to}")
+                        continue
+                    rendered_edges.add((edge.from_, edge.to))
+                    logger.debug(f"Creating edge: {edge.from_} -> {edge.to}")
+                    attrs = edge_attr(positions, edge.from_, edge.to)
+                    if edge.label:
+                        node_instances[edge.from_] >> Edge(label=edge.label, **attrs) >> node_instances[edge.to]
+                    elif attrs:
+                        node_instances[edge.from_] >> Edge(**attrs) >> node_instances[edge.to]
+                    else:
+                        node_instances[edge.from_] >> node_instances[edge.to]
+            
+            if diagram.layout_json is not None and get_settings().layout_cache_enabled:
+                cluster_ids = {f"cluster_{c.name}": c.id for c in spec.clusters}
+                if len(cluster_ids) == len(spec.clusters):
+                    computed = extract_positions(diagram.layout_json, cluster_ids, set(nodes_spec))
+                    if computed is not None:
+                        layout_cache.set(topology, json.dumps(computed).encode())
             
             # Read generated image
             image_path = f"{diagram_path}.png"
@@ -80,9 +223,7 @@ class DiagramService:
                 logger.info(f"Found image file, size: {file_size} bytes")
                 
                 with open(image_path, "rb") as f:
-                    image_data = base64.b64encode(f.read()).decode()
-                    logger.info(f"Encoded image to base64, length: {len(image_data)}")
-                    return image_data
+                    return f.read()
             else:
                 logger.error(f"Image file not found at {image_path}")
                 # List all files in temp directory
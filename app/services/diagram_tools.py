@@ -1,3 +1,5 @@
+import importlib
+
 # Available diagram tools for the agent
 DIAGRAM_TOOLS = {
     # AWS Compute
@@ -76,4 +78,11 @@ DIAGRAM_TOOLS = {
 
 def get_available_tools():
     """Get all available diagram tools"""
-    return DIAGRAM_TOOLS
\ No newline at end of file
+    return DIAGRAM_TOOLS
+
+def import_tool_modules():
+    """Import every diagrams provider module referenced by the tools"""
+    modules = sorted({type_path.rsplit(".", 1)[0] for type_path in DIAGRAM_TOOLS})
+    for module in modules:
+        importlib.import_module(f"diagrams.{module}")
+    return modules
\ No newline at end of file
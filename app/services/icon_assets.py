@@ -0,0 +1,73 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import importlib
+from typing import Iterable, List, Optional
+from PIL import Image
+from app.core.config import get_settings
+from app.services.diagram_tools import DIAGRAM_TOOLS
+
+logger = logging.getLogger(__name__)
+
+# Graphviz rasterizes at 96 dpi unless the graph sets dpi
+DEFAULT_DPI = 96
+# Width of a diagrams node box in inches; the icon is scaled to fit it
+ICON_INCHES = 1.4
+
+_lock = threading.Lock()
+_scaled = {}
+
+def icon_source(node_class) -> str:
+    """Path of the full-size icon bundled with the diagrams package"""
+    import diagrams
+    site_packages = os.path.dirname(os.path.dirname(os.path.abspath(diagrams.__file__)))
+    return os.path.join(site_packages, node_class._icon_dir, node_class._icon)
+
+def _scale(source: str, digest: str, dpi: int) -> str:
+    directory = os.path.join(get_settings().icon_cache_dir, str(dpi))
+    path = os.path.join(directory, f"{digest}.png")
+    if os.path.exists(path):
+        return path
+
+    size = round(ICON_INCHES * dpi)
+    with Image.open(source) as image:
+        image = image.convert("RGBA")
+        # Only shrink; Graphviz upscales small icons no slower than we could
+        image.thumbnail((size, size), Image.LANCZOS)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format="PNG")
+    # Atomic rename: workers share the directory and may build the same icon concurrently
+    os.replace(temp_path, path)
+    return path
+
+def scaled_icon(node_class, dpi: int) -> str:
+    """Icon pre-scaled to the rendered node size, shared between node types with identical artwork"""
+    key = (node_class, dpi)
+    path = _scaled.get(key)
+    if path is not None:
+        return path
+
+    source = icon_source(node_class)
+    with open(source, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:32]
+    path = _scale(source, digest, dpi)
+    with _lock:
+        _scaled[key] = path
+    return path
+
+def prepare_icons(type_paths: Iterable[str] = DIAGRAM_TOOLS, dpis: Optional[Iterable[int]] = None) -> List[str]:
+    """Build the scaled icons for the given node types and DPIs ahead of the first render"""
+    dpis = dpis or get_settings().icon_cache_dpis
+    paths = set()
+    for type_path in type_paths:
+        provider, module, cls_name = type_path.split(".")
+        node_class = getattr(importlib.import_module(f"diagrams.{provider}.{module}"), cls_name)
+        if not node_class._icon:
+            continue
+        for dpi in dpis:
+            paths.add(scaled_icon(node_class, dpi))
+    return sorted(paths)
@@ -0,0 +1,45 @@
+import io
+import logging
+from PIL import Image
+from app.core.config import get_settings
+from app.models.schemas import RenderOptions
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+def needs_conversion(options: RenderOptions) -> bool:
+    """Whether the options change the Graphviz PNG at all"""
+    return bool(options.width or options.format != "png" or options.optimize)
+
+def convert_image(png_bytes: bytes, options: RenderOptions) -> bytes:
+    """Resize, re-encode and optimize a rendered PNG according to render options"""
+    if not needs_conversion(options):
+        return png_bytes
+
+    settings = get_settings()
+    image = Image.open(io.BytesIO(png_bytes))
+    image.load()
+
+    if options.width and image.width > options.width:
+        height = max(1, round(image.height * options.width / image.width))
+        image = image.resize((options.width, height), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    if options.format == "webp":
+        image.save(
+            output,
+            format="WEBP",
+            lossless=settings.webp_lossless,
+            quality=settings.webp_quality,
+            method=4
+        )
+    else:
+        image.save(output, format="PNG", optimize=options.optimize)
+
+    result = output.getvalue()
+    logger.info(f"Converted image: {len(png_bytes)} -> {len(result)} bytes ({options.format}, {image.width}px)")
+    return result
\ No newline at end of file
@@ -0,0 +1,92 @@
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Optional
+from app.core.config import get_settings
+from app.services.image_output import IMAGE_MEDIA_TYPES
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class ImageStore:
+    """Content-addressed image files on local disk, evicting least recently stored past max_bytes"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._scan())
+
+    def _path(self, digest: str, image_format: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.root, digest[:2], f"{digest}.{image_format}")
+
+    def _scan(self):
+        for shard in os.scandir(self.root):
+            if shard.is_dir():
+                yield from (entry for entry in os.scandir(shard.path) if entry.is_file())
+
+    def put(self, data: bytes, image_format: str) -> str:
+        """Store image bytes and return their sha256 digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, image_format)
+        try:
+            # Refresh the mtime so eviction treats it as recently used
+            os.utime(path)
+            return digest
+        except FileNotFoundError:
+            # Never stored, or evicted by another worker: write it (again)
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # Atomic rename, so concurrent readers never see a partial file
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return digest
+
+    def get_path(self, digest: str) -> Optional[str]:
+        """Path and media type of a stored image, or None if unknown or evicted"""
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        for image_format in IMAGE_MEDIA_TYPES:
+            path = self._path(digest, image_format)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _evict(self) -> None:
+        # Rescan rather than trust the running total: other workers write to the same directory
+        entries = sorted(
+            (entry for entry in self._scan() if not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        self._size = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._size <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except FileNotFoundError:
+                continue
+        logger.info(f"Image store evicted down to {self._size} bytes")
+
+@lru_cache()
+def get_image_store() -> ImageStore:
+    settings = get_settings()
+    return ImageStore(settings.image_store_path, settings.image_store_max_bytes)
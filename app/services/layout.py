@@ -0,0 +1,45 @@
+import logging
+from typing import Optional
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec
+
+logger = logging.getLogger(__name__)
+
+def select_layout(spec: DiagramSpec, engine: Optional[str] = None) -> dict:
+    """Pick a Graphviz layout engine and graph attributes from spec size and density"""
+    settings = get_settings()
+    node_count = len(spec.nodes)
+    edge_count = len(spec.edges)
+    density = edge_count / node_count if node_count else 0.0
+    dense = density >= settings.layout_dense_edge_ratio
+
+    if engine is None:
+        if node_count >= settings.layout_sfdp_nodes:
+            engine = "sfdp"
+        elif node_count >= settings.layout_neato_nodes:
+            engine = "neato"
+        else:
+            engine = "dot"
+
+    graph_attr = {}
+    if engine == "dot":
+        if node_count >= settings.layout_bounded_dot_nodes or dense:
+            # Bound network simplex and mincross iterations for big graphs
+            graph_attr["nslimit"] = settings.layout_nslimit
+            graph_attr["nslimit1"] = settings.layout_nslimit
+            graph_attr["mclimit"] = settings.layout_mclimit
+        if dense:
+            # Orthogonal routing does not support concentrated edges
+            graph_attr["concentrate"] = "true"
+            graph_attr["splines"] = "polyline"
+    else:
+        graph_attr["layout"] = engine
+        graph_attr["overlap"] = "prism" if engine == "sfdp" else "false"
+        graph_attr["splines"] = "line" if engine == "sfdp" else "true"
+        graph_attr["outputorder"] = "edgesfirst"
+
+    logger.info(
+        f"Layout: {engine} (nodes={node_count}, edges={edge_count}, "
+        f"density={density:.2f}, attrs={graph_attr})"
+    )
+    return {"engine": engine, "graph_attr": graph_attr}
\ No newline at end of file
@@ -0,0 +1,112 @@
+import json
+import hashlib
+import logging
+import subprocess
+from typing import Optional
+from diagrams import Diagram
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec
+from app.services.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+# Computed layouts keyed by topology, shared like the render cache
+layout_cache = get_cache("layout", get_settings().layout_cache_max_bytes)
+
+def label_size(label: Optional[str]) -> tuple:
+    """Line count and longest line of a label, which is what Graphviz sizes it by"""
+    if not label:
+        return (0, 0)
+    lines = label.split("\n")
+    return (len(lines), max(len(line) for line in lines))
+
+def topology_hash(spec: DiagramSpec, graph_attr: dict) -> str:
+    """Hash of everything that moves nodes around: ids, clusters, edges, label sizes and layout settings.
+
+    Label text and node types are left out, so an edit that keeps every label the same
+    size reuses the layout. The diagram name is the graph label and is kept as is.
+    """
+    # Duplicate edges are merged at render time and keep the first label
+    edges = {}
+    for e in spec.edges:
+        edges.setdefault((e.from_, e.to), label_size(e.label))
+    topology = {
+        "name": spec.diagram.name,
+        "nodes": sorted((n.id, label_size(n.label)) for n in spec.nodes),
+        "clusters": [(c.id, label_size(c.name), sorted(c.nodes)) for c in spec.clusters],
+        "edges": sorted((source, target, size) for (source, target), size in edges.items()),
+        "graph_attr": sorted(graph_attr.items())
+    }
+    return hashlib.sha256(json.dumps(topology).encode()).hexdigest()
+
+def extract_positions(layout_json: bytes, cluster_ids: dict, node_ids: set) -> Optional[dict]:
+    """Pull node, cluster and edge coordinates out of Graphviz -Tjson output.
+
+    cluster_ids maps Graphviz subgraph names to spec cluster ids, node_ids are the spec
+    node ids. Returns None if the layout cannot be fully mapped back onto the spec.
+    """
+    data = json.loads(layout_json)
+    objects = data.get("objects", [])
+    # Subgraphs come first in objects, nodes after them, each at the index of its _gvid
+    subgraph_count = data.get("_subgraph_cnt", 0)
+    if any(obj.get("_gvid") != index for index, obj in enumerate(objects)):
+        return None
+    if {obj["name"] for obj in objects[subgraph_count:]} != set(node_ids):
+        return None
+
+    positions = {"bb": data["bb"], "lp": data.get("lp"), "clusters": {}, "nodes": {}, "edges": {}}
+    for obj in objects[:subgraph_count]:
+        cluster_id = cluster_ids.get(obj["name"])
+        if cluster_id is None or "bb" not in obj:
+            return None
+        positions["clusters"][cluster_id] = {"bb": obj["bb"], "lp": obj.get("lp")}
+    for obj in objects[subgraph_count:]:
+        if "pos" not in obj:
+            return None
+        positions["nodes"][obj["name"]] = obj["pos"]
+    for edge in data.get("edges", []):
+        if not (subgraph_count <= edge["tail"] < len(objects) and subgraph_count <= edge["head"] < len(objects)):
+            return None
+        key = f"{objects[edge['tail']]['name']}->{objects[edge['head']]['name']}"
+        positions["edges"][key] = {"pos": edge["pos"], "lp": edge.get("lp")}
+    return positions
+
+def _fixed(attrs: dict) -> dict:
+    return {k: v for k, v in attrs.items() if v is not None}
+
+def positioned_graph_attr(positions: dict) -> dict:
+    # neato -n2 keeps the given coordinates; overlap removal would move them
+    return _fixed({"layout": "neato", "overlap": "true", "bb": positions["bb"], "lp": positions.get("lp")})
+
+def cluster_attr(positions: Optional[dict], cluster_id: str) -> dict:
+    return _fixed(positions["clusters"][cluster_id]) if positions else {}
+
+def node_attr(positions: Optional[dict], node_id: str) -> dict:
+    return {"pos": positions["nodes"][node_id]} if positions else {}
+
+def edge_attr(positions: Optional[dict], from_id: str, to_id: str) -> dict:
+    if not positions:
+        return {}
+    return _fixed(positions["edges"].get(f"{from_id}->{to_id}", {}))
+
+class PositionedDiagram(Diagram):
+    """Diagram that also emits its layout, or renders from a previously computed one"""
+
+    def __init__(self, *args, positions: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.positions = positions
+        self.layout_json = None
+
+    def render(self) -> None:
+        self.dot.save()
+        image_path = f"{self.filename}.{self.outformat}"
+        if self.positions is None:
+            # One Graphviz run writes both the image and the positioned layout
+            layout_path = f"{self.filename}.json"
+            command = [self.dot.engine, f"-T{self.outformat}", "-o", image_path, "-Tjson", "-o", layout_path, self.filename]
+        else:
+            command = ["neato", "-n2", f"-T{self.outformat}", "-o", image_path, self.filename]
+        subprocess.run(command, check=True, capture_output=True)
+        if self.positions is None:
+            with open(layout_path, "rb") as f:
+                self.layout_json = f.read()
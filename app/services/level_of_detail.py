@@ -0,0 +1,86 @@
+import logging
+from collections import Counter
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions, NodeSpec, EdgeSpec
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_NODE_PREFIX = "cluster__"
+
+def apply_level_of_detail(spec: DiagramSpec, options: RenderOptions) -> DiagramSpec:
+    """Reduce spec to the requested level of detail before rendering"""
+    if options.focus_cluster:
+        return focus_cluster(spec, options.focus_cluster)
+
+    budget = get_settings().lod_node_budget
+    if options.detail == "overview" or (options.detail == "auto" and len(spec.nodes) > budget):
+        logger.info(f"Spec has {len(spec.nodes)} nodes (budget {budget}), collapsing clusters")
+        return collapse_clusters(spec)
+    return spec
+
+def collapse_clusters(spec: DiagramSpec) -> DiagramSpec:
+    """Collapse every cluster into a summary node and aggregate edges between them"""
+    nodes_spec = {n.id: n for n in spec.nodes}
+    representative = {}
+    summary_nodes = []
+
+    for cluster in spec.clusters:
+        members = [node_id for node_id in cluster.nodes if node_id in nodes_spec and node_id not in representative]
+        if not members:
+            continue
+        summary_id = f"{SUMMARY_NODE_PREFIX}{cluster.id}"
+        node_type = Counter(nodes_spec[node_id].type for node_id in members).most_common(1)[0][0]
+        summary_nodes.append(NodeSpec(
+            id=summary_id,
+            type=node_type,
+            label=f"{cluster.name}\n({len(members)} nodes)"
+        ))
+        for node_id in members:
+            representative[node_id] = summary_id
+
+    standalone_nodes = [n for n in spec.nodes if n.id not in representative]
+
+    # Aggregate edges between collapsed endpoints, dropping intra-cluster edges
+    edge_counts = Counter()
+    edge_labels = {}
+    for edge in spec.edges:
+        source = representative.get(edge.from_, edge.from_)
+        target = representative.get(edge.to, edge.to)
+        if source == target:
+            continue
+        edge_counts[(source, target)] += 1
+        edge_labels.setdefault((source, target), edge.label)
+
+    edges = []
+    for (source, target), count in edge_counts.items():
+        label = f"{count} connections" if count > 1 else edge_labels[(source, target)]
+        edges.append(EdgeSpec.model_validate({"from": source, "to": target, "label": label}))
+
+    logger.info(
+        f"Collapsed {len(spec.nodes)} nodes / {len(spec.edges)} edges into "
+        f"{len(summary_nodes) + len(standalone_nodes)} nodes / {len(edges)} edges"
+    )
+    return DiagramSpec(
+        diagram=spec.diagram.model_copy(update={"name": f"{spec.diagram.name} (overview)"}),
+        nodes=summary_nodes + standalone_nodes,
+        clusters=[],
+        edges=edges
+    )
+
+def focus_cluster(spec: DiagramSpec, cluster_id: str) -> DiagramSpec:
+    """Keep a single cluster plus the nodes directly connected to it"""
+    cluster = next((c for c in spec.clusters if c.id == cluster_id), None)
+    if cluster is None:
+        raise ValueError(f"Unknown cluster: {cluster_id}")
+
+    members = set(cluster.nodes)
+    edges = [e for e in spec.edges if e.from_ in members or e.to in members]
+    keep = members | {e.from_ for e in edges} | {e.to for e in edges}
+
+    logger.info(f"Drill-down into cluster {cluster_id}: {len(members)} members, {len(keep) - len(members)} neighbors")
+    return DiagramSpec(
+        diagram=spec.diagram.model_copy(update={"name": f"{spec.diagram.name} - {cluster.name}"}),
+        nodes=[n for n in spec.nodes if n.id in keep],
+        clusters=[cluster],
+        edges=edges
+    )
\ No newline at end of file
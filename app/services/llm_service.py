@@ -1,31 +1,211 @@
 import json
+import time
+import socket
+import hashlib
 import logging
+from functools import lru_cache
+from typing import Optional, Tuple
 from openai import OpenAI
+from pydantic import ValidationError
 from app.core.config import get_settings
-from app.services.diagram_tools import get_available_tools
+from app.core.metrics import metrics
+from app.core.cancellation import RequestCancelled, current_endpoint, interrupt_on_cancel, raise_if_cancelled
+from app.services.tool_catalog import select_prompt_tools
 from app.models.schemas import DiagramSpec
+from app.services.cache import get_cache
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.model_router import record_route, route_request
+from app.services.rule_based_generator import generate_rule_based_spec
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+spec_cache = get_cache(
+    "spec",
+    get_settings().spec_cache_max_bytes,
+    get_settings().spec_cache_ttl_seconds
+)
+
+spec_flight = SingleFlight("spec")
+
+llm_circuit = CircuitBreaker(
+    "openrouter",
+    get_settings().circuit_failure_threshold,
+    get_settings().circuit_reset_seconds
+)
+
+def description_key(description: str, model: str) -> str:
+    """Cache key for a description, ignoring case and whitespace differences"""
+    normalized = " ".join(description.lower().split())
+    return hashlib.sha256(f"{model}\n{normalized}".encode()).hexdigest()
+
+def json_bounds(text: str) -> Tuple[int, int]:
+    """Start and end offsets of the JSON in an LLM reply, excluding whitespace and code fences"""
+    start, end = 0, len(text)
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if text.startswith("```", start):
+        newline = text.find("\n", start)
+        start = end if newline == -1 else newline + 1
+        if text.endswith("```", start, end):
+            end -= 3
+    return start, end
+
+def shutdown_stream(stream) -> None:
+    """Shut down the socket under a streamed response, waking the thread blocked reading it.
+
+    Closing the response is not enough: close() does not interrupt a read in progress on another thread.
+    """
+    network_stream = stream.response.extensions.get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+    if sock is None:
+        stream.close()
+        return
+    try:
+        # Plain socket shutdown, also for TLS: SSLSocket.shutdown would tear down the TLS state under the reader
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+@lru_cache()
+def get_openai_client() -> OpenAI:
+    """Shared OpenRouter client so requests reuse one connection pool"""
+    settings = get_settings()
+    client = OpenAI(
+        api_key=settings.openrouter_api_key,
+        base_url="https://openrouter.ai/api/v1"
+    )
+    logger.info("OpenRouter client configured successfully")
+    return client
+
 class LLMService:
     def __init__(self):
         self.settings = get_settings()
         if not self.settings.is_openrouter_configured:
             raise Exception("OPENROUTER_API_KEY not configured")
         
-        self.client = OpenAI(
-            api_key=self.settings.openrouter_api_key,
-            base_url="https://openrouter.ai/api/v1"
-        )
-        logger.info("OpenRouter client configured successfully")
+        self.client = get_openai_client()
     
-    def generate_diagram_spec(self, description: str) -> DiagramSpec:
-        """Use OpenRouter agent to generate diagram specification from description"""
+    def _complete(self, operation: str, route: dict, messages: list, temperature: float, max_tokens: int,
+                  timeout: Optional[float] = None) -> str:
+        """Call the routed model and record per-tier metrics"""
+        labels = {"operation": operation, "tier": route["tier"]}
+        metrics.inc("llm_requests_total", labels)
+        record_route(route, current_endpoint())
+        started = time.perf_counter()
+        raise_if_cancelled("llm")
+        parts, finish_reason, usage = [], None, None
+        try:
+            # Streamed so a client disconnect can close the upstream request mid-generation
+            stream = self.client.with_options(timeout=timeout or self.settings.llm_timeout_seconds).chat.completions.create(
+                model=route["model"],
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            # The loop only checks the token between chunks; the watchdog also covers the wait for the first one
+            with stream, interrupt_on_cancel(lambda: shutdown_stream(stream), "llm"):
+                for chunk in stream:
+                    raise_if_cancelled("llm")
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices:
+                        parts.append(chunk.choices[0].delta.content or "")
+                        finish_reason = chunk.choices[0].finish_reason or finish_reason
+            # An interrupted stream just ends early
+            raise_if_cancelled("llm")
+        except RequestCancelled:
+            logger.info(f"{operation} cancelled after {len(parts)} chunks")
+            raise
+        except Exception:
+            # ...or fails as a connection error, which is the client's doing, not the upstream's
+            raise_if_cancelled("llm")
+            metrics.inc("llm_errors_total", labels)
+            llm_circuit.record_failure()
+            raise
+        finally:
+            metrics.observe("llm_request_seconds", time.perf_counter() - started, labels)
+        llm_circuit.record_success()
+        
+        if usage:
+            metrics.inc("llm_completion_tokens_total", labels, usage.completion_tokens)
+            metrics.inc("llm_prompt_tokens_total", labels, usage.prompt_tokens)
+        if finish_reason == "length":
+            # Truncated output means the max_tokens budget for this tier is too tight
+            metrics.inc("llm_truncated_total", labels)
+            logger.warning(f"{operation} response truncated at max_tokens={max_tokens} ({route['tier']} tier)")
+        return "".join(parts)
+    
+    def _llm_budget(self, deadline: Optional[float]) -> Tuple[float, Optional[str]]:
+        """Timeout for the next LLM call, and the reason to skip the LLM if it should be skipped"""
+        timeout = self.settings.llm_timeout_seconds
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if llm_circuit.is_open:
+            return timeout, "circuit_open"
+        if timeout < self.settings.llm_min_budget_seconds:
+            return timeout, "deadline"
+        return timeout, None
+    
+    def generate_diagram_spec(self, description: str, deadline: Optional[float] = None) -> DiagramSpec:
+        """Generate a diagram specification, using the rule-based generator when the LLM can be skipped"""
         logger.info(f"Generating diagram spec for: {description[:50]}...")
         
-        # Agent prompt with available tools
-        tools_list = "\n".join([f"- {k}: {v}" for k, v in get_available_tools().items()])
-        logger.info(f"Available tools: {len(get_available_tools())}")
+        route = route_request(description)
+        cache_key = description_key(description, route["model"])
+        cached = spec_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Spec cache hit, skipping LLM call")
+            return DiagramSpec.model_validate_json(cached)
+        
+        # Concurrent requests for the same description share one generation
+        return spec_flight.do(cache_key, lambda: self._generate_uncached(description, route, cache_key, deadline))
+    
+    def _generate_uncached(self, description: str, route: dict, cache_key: str, deadline: Optional[float]) -> DiagramSpec:
+        """Generate a spec on a cache miss; runs once per in-flight description"""
+        # A flight that finished just before this one started has already filled the cache
+        cached = spec_cache.get(cache_key)
+        if cached is not None:
+            return DiagramSpec.model_validate_json(cached)
+        
+        # Fast path: simple descriptions the rules fully understand need no LLM round trip
+        rule_result = generate_rule_based_spec(description)
+        if (self.settings.rule_fast_path_enabled and route["tier"] == "fast"
+                and rule_result.confidence >= self.settings.rule_fast_path_confidence):
+            logger.info(f"Using rule-based spec (confidence {rule_result.confidence})")
+            metrics.inc("spec_rule_based_total", {"reason": "fast_path"})
+            return rule_result.spec
+        
+        timeout, fallback_reason = self._llm_budget(deadline)
+        if fallback_reason is None:
+            try:
+                spec = self._generate_with_llm(description, route, timeout)
+                spec_cache.set(cache_key, spec.model_dump_json(by_alias=True).encode())
+                return spec
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                if rule_result.spec is None:
+                    raise
+                logger.warning(f"LLM spec generation failed, falling back to rules: {e}")
+                fallback_reason = "llm_error"
+        
+        if rule_result.spec is None:
+            raise Exception(f"LLM unavailable ({fallback_reason}) and no components recognized in description")
+        logger.info(f"Using rule-based spec ({fallback_reason}, confidence {rule_result.confidence})")
+        metrics.inc("spec_rule_based_total", {"reason": fallback_reason})
+        return rule_result.spec
+    
+    def _generate_with_llm(self, description: str, route: dict, timeout: float) -> DiagramSpec:
+        """Use OpenRouter agent to generate diagram specification from description"""
+        # Agent prompt with the node types most relevant to this description
+        prompt_tools = select_prompt_tools(description)
+        tools_list = "\n".join([f"- {k}: {v}" for k, v in prompt_tools.items()])
+        logger.info(f"Prompt tools: {len(prompt_tools)}")
         
         system_prompt = f"""You are a system architecture agent. You have access to these diagram tools:
 
@@ -121,58 +301,44 @@ Rules:
         logger.debug(f"System prompt length: {len(system_prompt)} characters")
         logger.debug(f"User prompt: {user_prompt}")
         
-        response = self.client.chat.completions.create(
-            model=self.settings.openrouter_model,
-            messages=[
+        response_text = self._complete(
+            "generate_spec",
+            route,
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.1,
-            max_tokens=2000
+            max_tokens=route["max_tokens"],
+            timeout=timeout
         )
         
         logger.info("Received response from OpenRouter")
         
-        response_text = response.choices[0].message.content.strip()
         logger.info(f"Raw response length: {len(response_text)} characters")
-        logger.info(f"Raw response preview: {response_text[:200]}...")
+        logger.debug(f"Raw response preview: {response_text[:200]}...")
         
-        # Clean response
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-            logger.info("Removed ```json prefix")
-        if response_text.startswith('```'):
-            response_text = response_text[3:]
-            logger.info("Removed ``` prefix")
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-            logger.info("Removed ``` suffix")
-        response_text = response_text.strip()
-        
-        logger.info(f"Cleaned response length: {len(response_text)} characters")
-        logger.info(f"Cleaned response: {response_text[:500]}...")
-        
-        # Parse JSON
+        # Validate straight from the JSON text, skipping any ```json fence
+        start, end = json_bounds(response_text)
         try:
-            spec_dict = json.loads(response_text)
-            logger.info("Successfully parsed JSON response")
-            logger.info(f"Parsed spec: {json.dumps(spec_dict, indent=2)[:300]}...")
-            
-            # Convert to Pydantic model
-            spec = DiagramSpec(**spec_dict)
-            return spec
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing failed: {e}")
+            spec = DiagramSpec.model_validate_json(response_text[start:end])
+        except ValidationError as e:
+            logger.error(f"Failed to parse LLM response: {e}")
             logger.error(f"Failed to parse: {response_text}")
-            raise Exception(f"Failed to parse LLM response as JSON: {e}")
-        except Exception as e:
-            logger.error(f"Failed to create DiagramSpec: {e}")
+            if any(error["type"] == "json_invalid" for error in e.errors()):
+                raise Exception(f"Failed to parse LLM response as JSON: {e}")
             raise
+        logger.info(f"Parsed spec: {len(spec.nodes)} nodes, {len(spec.clusters)} clusters, {len(spec.edges)} edges")
+        return spec
     
-    def process_assistant_request(self, message: str, context: str = None) -> dict:
+    def process_assistant_request(self, message: str, context: str = None, deadline: Optional[float] = None) -> dict:
         """Process assistant request to understand user intent"""
         logger.info(f"Processing assistant request: {message[:50]}...")
         
+        timeout, fallback_reason = self._llm_budget(deadline)
+        if fallback_reason is not None:
+            return self._assistant_fallback(message, fallback_reason)
+        
         system_prompt = """You are a helpful assistant that specializes in system architecture diagrams.
 
 You can:
@@ -201,17 +367,23 @@ IMPORTANT: Always respond with ONLY valid JSON without additional text. No newli
         
         logger.info("Sending assistant request to OpenRouter...")
         
-        response = self.client.chat.completions.create(
-            model=self.settings.openrouter_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        
-        response_text = response.choices[0].message.content.strip()
+        try:
+            response_text = self._complete(
+                "assistant",
+                route_request(f"{message} {context or ''}"),
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,
+                max_tokens=1000,
+                timeout=timeout
+            ).strip()
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"Assistant LLM call failed, falling back to rules: {e}")
+            return self._assistant_fallback(message, "llm_error")
         logger.info(f"Assistant response: {response_text[:200]}...")
         
         # Clean response
@@ -238,4 +410,20 @@ IMPORTANT: Always respond with ONLY valid JSON without additional text. No newli
             return {
                 "action": "conversation",
                 "response": "I apologize, but I encountered an error processing your request. Please try again."
-            }
\ No newline at end of file
+            }
+    
+    def _assistant_fallback(self, message: str, reason: str) -> dict:
+        """Without the LLM, treat a message naming known components as a diagram request"""
+        metrics.inc("assistant_rule_based_total", {"reason": reason})
+        if generate_rule_based_spec(message).spec is not None:
+            logger.info(f"Assistant using rule-based intent ({reason})")
+            return {
+                "action": "generate_diagram",
+                "response": "I'll create that diagram for you.",
+                "description": message
+            }
+        return {
+            "action": "conversation",
+            "response": "The assistant is temporarily unavailable. Describe the components you need "
+                        "(for example: a load balancer, two EC2 instances and an RDS database) and I'll draw them."
+        }
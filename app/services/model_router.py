@@ -0,0 +1,71 @@
+import re
+import logging
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Words that usually name one architecture component
+COMPONENT_WORDS = {
+    "service", "services", "server", "servers", "database", "databases", "db", "queue", "queues",
+    "cache", "caches", "gateway", "balancer", "lb", "alb", "elb", "nlb", "function", "functions",
+    "lambda", "bucket", "buckets", "storage", "cdn", "dns", "instance", "instances", "ec2", "rds",
+    "sqs", "sns", "kafka", "redis", "worker", "workers", "api", "frontend", "backend",
+    "warehouse", "stream", "topic", "broker", "firewall", "monitoring", "cloudwatch",
+    "auth", "authentication", "search", "analytics", "container", "containers", "pod", "pods",
+    "node", "nodes", "replica", "replicas", "proxy", "registry", "scheduler", "etl", "pipeline"
+}
+
+# Phrases that introduce a grouping (cluster, tier, zone...)
+CLUSTER_PATTERN = re.compile(r"\b(cluster|group|tier|zone|region|subnet|vpc|namespace|layer)s?\b", re.IGNORECASE)
+
+NUMBER_WORDS = {
+    "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+
+def estimate_complexity(description: str) -> dict:
+    """Cheap local estimate of how large the requested architecture is"""
+    tokens = re.findall(r"[a-z0-9]+", description.lower())
+    components = 0
+    for i, token in enumerate(tokens):
+        # Adjacent component words ("RDS database") name a single component
+        if token not in COMPONENT_WORDS or (i and tokens[i - 1] in COMPONENT_WORDS):
+            continue
+        # "three services" counts as three components
+        previous = tokens[i - 1] if i else ""
+        multiplier = NUMBER_WORDS.get(previous) or (int(previous) if previous.isdigit() else 1)
+        components += min(multiplier, 50)
+    clusters = len(CLUSTER_PATTERN.findall(description))
+    words = len(description.split())
+    score = components + 2 * clusters + words / 40
+    return {"score": round(score, 2), "components": components, "clusters": clusters, "words": words}
+
+def route_request(description: str) -> dict:
+    """Pick a model tier and max_tokens budget for a diagram description"""
+    settings = get_settings()
+    complexity = estimate_complexity(description)
+
+    if not settings.model_routing_enabled:
+        tier = "strong"
+    elif complexity["score"] <= settings.routing_fast_max_score:
+        tier = "fast"
+    else:
+        tier = "strong"
+
+    model = settings.openrouter_fast_model if tier == "fast" else settings.openrouter_model
+    max_tokens = (
+        settings.spec_base_tokens
+        + settings.spec_tokens_per_component * complexity["components"]
+        + settings.spec_tokens_per_cluster * complexity["clusters"]
+    )
+    max_tokens = max(settings.spec_min_tokens, min(settings.spec_max_tokens, max_tokens))
+
+    route = {"tier": tier, "model": model, "max_tokens": max_tokens, **complexity}
+    logger.info(f"Routing: {route}")
+    return route
+
+def record_route(route: dict, endpoint: str) -> None:
+    """Count a routing decision; called only when the routed model is actually invoked"""
+    labels = {"tier": route["tier"], "endpoint": endpoint}
+    metrics.inc("llm_route_total", labels)
+    metrics.inc("llm_route_score_sum", labels, route["score"])
\ No newline at end of file
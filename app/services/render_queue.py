@@ -0,0 +1,454 @@
+import hmac
+import time
+import uuid
+import errno
+import select
+import socket
+import struct
+import logging
+import threading
+import socketserver
+import multiprocessing
+from abc import ABC, abstractmethod
+from collections import deque
+from functools import lru_cache
+from typing import Optional, Tuple
+import orjson
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.cancellation import RequestCancelled, current_token, raise_if_cancelled
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.render_sandbox import RenderError, RenderInputTooLarge, RenderLimitExceeded, RenderTimeout
+
+logger = logging.getLogger(__name__)
+
+# Frame: header length, body length, JSON header, raw body (image bytes)
+FRAME = struct.Struct("!II")
+# How often idle loops wake up to check queues, heartbeats and cancellation
+POLL_SECONDS = 0.1
+
+class RenderUnavailable(RenderError):
+    status_code = 503
+
+# Error kinds carried over the wire, mapped back to the exceptions the endpoints handle
+ERROR_KINDS = {
+    "too_large": RenderInputTooLarge,
+    "limit": RenderLimitExceeded,
+    "timeout": RenderTimeout,
+    "unavailable": RenderUnavailable,
+    "invalid": ValueError,
+    "cancelled": RequestCancelled,
+}
+
+def error_kind(error: Exception) -> str:
+    for kind, error_class in ERROR_KINDS.items():
+        if isinstance(error, error_class):
+            return kind
+    # Same classification as the sandbox: a spec that cannot be built is the caller's fault
+    if isinstance(error, (KeyError, AttributeError)):
+        return "invalid"
+    return "error"
+
+def raise_error(kind: str, detail: str):
+    raise ERROR_KINDS.get(kind, Exception)(detail)
+
+def send_message(sock: socket.socket, header: dict, body: bytes = b"") -> None:
+    data = orjson.dumps(header)
+    sock.sendall(FRAME.pack(len(data), len(body)) + data + body)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        buffer += chunk
+    return bytes(buffer)
+
+def recv_message(sock: socket.socket) -> Tuple[dict, bytes]:
+    header_size, body_size = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    header = orjson.loads(_recv_exact(sock, header_size))
+    return header, _recv_exact(sock, body_size)
+
+def _readable(sock: socket.socket, timeout: float = 0) -> bool:
+    return bool(select.select([sock], [], [], timeout)[0])
+
+class RenderJob:
+    def __init__(self, spec_json: str, options_json: str):
+        self.job_id = uuid.uuid4().hex
+        self.spec_json = spec_json
+        self.options_json = options_json
+        self.attempts = 0
+        self.cancelled = False
+        self.done = threading.Event()
+        self.image = None
+        self.error = None
+
+    def resolve(self, image: bytes) -> None:
+        self.image = image
+        self.done.set()
+
+    def fail(self, kind: str, detail: str) -> None:
+        self.error = (kind, detail)
+        self.done.set()
+
+class JobQueue(ABC):
+    """Where submitted render jobs wait for a worker.
+
+    The broker only needs these operations, so a queue backed by an external
+    message broker can replace the in-memory one without touching workers or clients.
+    """
+
+    @abstractmethod
+    def put(self, job: RenderJob) -> None:
+        ...
+
+    @abstractmethod
+    def requeue(self, job: RenderJob) -> None:
+        """Return a job whose worker was lost, ahead of newer work"""
+
+    @abstractmethod
+    def take(self, timeout: float) -> Optional[RenderJob]:
+        """Next job that has not been cancelled, or None after timeout seconds"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+class InMemoryJobQueue(JobQueue):
+    def __init__(self):
+        self._jobs = deque()
+        self._condition = threading.Condition()
+
+    def put(self, job: RenderJob) -> None:
+        with self._condition:
+            self._jobs.append(job)
+            self._condition.notify()
+
+    def requeue(self, job: RenderJob) -> None:
+        with self._condition:
+            self._jobs.appendleft(job)
+            self._condition.notify()
+
+    def take(self, timeout: float) -> Optional[RenderJob]:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                while self._jobs:
+                    job = self._jobs.popleft()
+                    # Jobs whose client went away are dropped instead of rendered
+                    if not job.cancelled:
+                        return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._jobs)
+
+class _BrokerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class RenderBroker:
+    """Local-socket broker between API processes (clients) and render workers.
+
+    Workers pull one job at a time from the shared queue, so an idle worker always picks
+    up the next job and a slow worker never builds a backlog (work stealing). Workers send
+    heartbeats; a job whose worker disconnects or stops heartbeating is requeued. When the
+    client of a running job hangs up, the worker is told to abort it.
+    """
+
+    def __init__(self, host: str, port: int, queue: Optional[JobQueue] = None,
+                 heartbeat_timeout: float = 10.0, max_attempts: int = 3, token: str = ""):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.queue = queue or InMemoryJobQueue()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.workers = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self) -> None:
+        """Serve in a background thread; use start_broker_process() before forking workers"""
+        self._listen()
+        threading.Thread(target=self._server.serve_forever, name="render-broker", daemon=True).start()
+
+    def serve_forever(self) -> None:
+        self._listen()
+        self._server.serve_forever()
+
+    def _listen(self) -> None:
+        if not self.token and not _is_loopback(self.host):
+            raise RuntimeError(f"RENDER_BROKER_TOKEN must be set for a broker listening on {self.host}")
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._handle(self.request, self.client_address)
+
+        self._server = _BrokerServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        logger.info(f"Render broker listening on {self.host}:{self.port}")
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            workers = [
+                {**info, "healthy": now - info["last_heartbeat"] <= self.heartbeat_timeout}
+                for info in self.workers.values()
+            ]
+        return {"queued": len(self.queue), "workers": workers}
+
+    def _handle(self, sock: socket.socket, address) -> None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            hello, _ = recv_message(sock)
+            if not hmac.compare_digest(str(hello.get("token", "")).encode(), self.token.encode()):
+                logger.warning(f"Render broker rejected {address[0]}: bad token")
+                metrics.inc("render_broker_rejected_total")
+                return
+            if hello.get("role") == "worker":
+                self._serve_worker(sock, hello, address)
+            else:
+                self._serve_client(sock)
+        except (ConnectionError, OSError) as e:
+            logger.debug(f"Broker connection from {address} closed: {e}")
+
+    def _serve_client(self, sock: socket.socket) -> None:
+        while True:
+            header, _ = recv_message(sock)
+            if header["type"] == "status":
+                send_message(sock, {"type": "status", **self.status()})
+                continue
+
+            with self._lock:
+                has_workers = bool(self.workers)
+            if not has_workers:
+                send_message(sock, {"type": "result", "status": "error", "kind": "unavailable",
+                                    "detail": "No render workers connected"})
+                continue
+
+            job = RenderJob(header["spec"], header["options"])
+            self.queue.put(job)
+            while not job.done.wait(POLL_SECONDS):
+                # The client sends nothing while waiting, so readable means it hung up
+                if _readable(sock):
+                    job.cancelled = True
+                    metrics.inc("render_jobs_total", {"result": "cancelled"})
+                    return
+            if job.error is None:
+                metrics.inc("render_jobs_total", {"result": "ok"})
+                send_message(sock, {"type": "result", "status": "ok"}, job.image)
+            else:
+                metrics.inc("render_jobs_total", {"result": job.error[0]})
+                send_message(sock, {"type": "result", "status": "error", "kind": job.error[0], "detail": job.error[1]})
+
+    def _serve_worker(self, sock: socket.socket, hello: dict, address) -> None:
+        worker_id = hello["worker_id"]
+        info = {
+            "worker_id": worker_id,
+            "pid": hello.get("pid"),
+            "address": f"{address[0]}:{address[1]}",
+            "connected_at": time.time(),
+            "last_heartbeat": time.time(),
+            "current_job": None,
+            "jobs_done": 0,
+            "jobs_failed": 0,
+            "jobs_cancelled": 0,
+        }
+        with self._lock:
+            self.workers[worker_id] = info
+        logger.info(f"Render worker {worker_id} connected from {info['address']}")
+        try:
+            while True:
+                job = self.queue.take(POLL_SECONDS)
+                if job is None:
+                    self._drain_heartbeats(sock, info)
+                    continue
+                self._dispatch(sock, job, info)
+        finally:
+            with self._lock:
+                self.workers.pop(worker_id, None)
+            logger.info(f"Render worker {worker_id} disconnected")
+
+    def _drain_heartbeats(self, sock: socket.socket, info: dict) -> None:
+        while _readable(sock):
+            recv_message(sock)
+            info["last_heartbeat"] = time.time()
+        if time.time() - info["last_heartbeat"] > self.heartbeat_timeout:
+            raise ConnectionError("Heartbeat timeout")
+
+    def _dispatch(self, sock: socket.socket, job: RenderJob, info: dict) -> None:
+        job.attempts += 1
+        info["current_job"] = job.job_id
+        cancel_sent = False
+        try:
+            send_message(sock, {"type": "job", "job_id": job.job_id, "spec": job.spec_json, "options": job.options_json})
+            sock.settimeout(self.heartbeat_timeout)
+            while True:
+                if job.cancelled and not cancel_sent:
+                    # The client hung up or timed out; stop the render instead of finishing it for nobody
+                    send_message(sock, {"type": "cancel", "job_id": job.job_id})
+                    cancel_sent = True
+                if not _readable(sock, POLL_SECONDS):
+                    # A worker that goes quiet for longer than the heartbeat timeout is treated as lost
+                    if time.time() - info["last_heartbeat"] > self.heartbeat_timeout:
+                        raise ConnectionError("Heartbeat timeout")
+                    continue
+                header, body = recv_message(sock)
+                info["last_heartbeat"] = time.time()
+                if header["type"] == "result" and header["job_id"] == job.job_id:
+                    break
+            sock.settimeout(None)
+        except (ConnectionError, OSError):
+            self._requeue(job, info["worker_id"])
+            raise
+        finally:
+            info["current_job"] = None
+
+        if header["status"] == "ok":
+            info["jobs_done"] += 1
+            job.resolve(body)
+        elif header["kind"] == "cancelled":
+            info["jobs_cancelled"] += 1
+            job.fail(header["kind"], header["detail"])
+        else:
+            info["jobs_failed"] += 1
+            job.fail(header["kind"], header["detail"])
+
+    def _requeue(self, job: RenderJob, worker_id: str) -> None:
+        if job.cancelled:
+            return
+        if job.attempts < self.max_attempts:
+            logger.warning(f"Render worker {worker_id} lost, requeueing job {job.job_id} (attempt {job.attempts})")
+            metrics.inc("render_jobs_requeued_total")
+            self.queue.requeue(job)
+        else:
+            job.fail("unavailable", f"Render workers lost {job.attempts} times while rendering")
+
+class RemoteRenderer:
+    """API-side client: submits renders to the broker and waits for the image"""
+
+    def __init__(self, host: str, port: int, timeout: float, token: str = ""):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.token = token
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        # The broker never writes to an idle client, so a readable socket was closed by it
+        if sock is not None and _readable(sock):
+            self._close()
+            sock = None
+        if sock is None:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5.0)
+            except OSError as e:
+                raise RenderUnavailable(f"Render broker unreachable at {self.host}:{self.port}: {e}")
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            send_message(sock, {"type": "hello", "role": "client", "token": self.token})
+            self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _request(self, header: dict) -> socket.socket:
+        # A pooled connection may have been closed by a broker restart; retry once on a new one
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                send_message(sock, header)
+                return sock
+            except OSError as e:
+                self._close()
+                if attempt or e.errno not in (errno.EPIPE, errno.ECONNRESET):
+                    raise RenderUnavailable(f"Render broker connection failed: {e}")
+
+    def render(self, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        token = current_token()
+        sock = self._request({
+            "type": "submit",
+            "spec": spec.model_dump_json(by_alias=True),
+            "options": options.model_dump_json()
+        })
+        deadline = time.monotonic() + self.timeout
+        try:
+            while not _readable(sock, POLL_SECONDS):
+                if token is not None and token.cancelled:
+                    # Hanging up tells the broker to drop the job, or abort it on the worker
+                    self._close()
+                    raise_if_cancelled("render_remote")
+                if time.monotonic() >= deadline:
+                    self._close()
+                    raise RenderTimeout(f"Remote render exceeded {self.timeout:g}s")
+            header, body = recv_message(sock)
+        except (ConnectionError, OSError) as e:
+            self._close()
+            raise RenderUnavailable(f"Render broker connection lost: {e}")
+        if header["status"] == "ok":
+            return body
+        raise_error(header["kind"], header["detail"])
+
+    def status(self) -> dict:
+        sock = self._request({"type": "status"})
+        try:
+            header, _ = recv_message(sock)
+        except (ConnectionError, OSError) as e:
+            self._close()
+            raise RenderUnavailable(f"Render broker connection lost: {e}")
+        header.pop("type")
+        return header
+
+def _is_loopback(host: str) -> bool:
+    return host in ("localhost", "127.0.0.1", "::1") or host.startswith("127.")
+
+@lru_cache()
+def get_render_broker() -> RenderBroker:
+    settings = get_settings()
+    return RenderBroker(
+        settings.render_broker_host,
+        settings.render_broker_port,
+        heartbeat_timeout=settings.render_worker_timeout_seconds,
+        max_attempts=settings.render_job_max_attempts,
+        token=settings.render_broker_token
+    )
+
+def run_broker() -> None:
+    """Broker process main: serve until terminated"""
+    from app.core.logging import setup_logging
+    setup_logging()
+    get_render_broker().serve_forever()
+
+def start_broker_process() -> multiprocessing.Process:
+    """Run the broker in a fresh process, so processes forked later inherit none of its threads"""
+    process = multiprocessing.get_context("spawn").Process(target=run_broker, name="render-broker", daemon=True)
+    process.start()
+    logger.info(f"Started render broker process {process.pid}")
+    return process
+
+@lru_cache()
+def get_remote_renderer() -> RemoteRenderer:
+    settings = get_settings()
+    return RemoteRenderer(
+        settings.render_broker_host,
+        settings.render_broker_port,
+        settings.render_job_timeout_seconds,
+        token=settings.render_broker_token
+    )
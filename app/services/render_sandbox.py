@@ -0,0 +1,226 @@
+import os
+import time
+import queue
+import signal
+import logging
+import resource
+import threading
+import subprocess
+import multiprocessing
+from functools import lru_cache
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.cancellation import current_token, raise_if_cancelled
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.level_of_detail import apply_level_of_detail
+
+logger = logging.getLogger(__name__)
+
+# Granularity of the cancellation checks while queued for, or waiting on, a worker
+CANCEL_POLL_SECONDS = 0.1
+
+class RenderError(Exception):
+    """Render rejected or aborted by the sandbox; status_code is the HTTP status to return"""
+    status_code = 500
+
+class RenderInputTooLarge(RenderError):
+    status_code = 413
+
+class RenderLimitExceeded(RenderError):
+    status_code = 422
+
+class RenderTimeout(RenderError):
+    status_code = 504
+
+def check_input_limits(spec: DiagramSpec, options: RenderOptions) -> None:
+    """Reject specs too large to render before any Graphviz work starts.
+
+    Node, edge and label limits apply to the spec as rendered, after the level-of-detail
+    reduction; the raw spec only has to stay under the much larger MAX_RAW_SPEC_* caps.
+    """
+    settings = get_settings()
+    if len(spec.nodes) > settings.max_raw_spec_nodes:
+        raise RenderInputTooLarge(f"Too many nodes: {len(spec.nodes)} (limit {settings.max_raw_spec_nodes})")
+    if len(spec.edges) > settings.max_raw_spec_edges:
+        raise RenderInputTooLarge(f"Too many edges: {len(spec.edges)} (limit {settings.max_raw_spec_edges})")
+
+    rendered = apply_level_of_detail(spec, options)
+    if len(rendered.nodes) > settings.max_spec_nodes:
+        raise RenderInputTooLarge(
+            f"Too many nodes to render: {len(rendered.nodes)} after level of detail (limit {settings.max_spec_nodes})"
+        )
+    if len(rendered.edges) > settings.max_spec_edges:
+        raise RenderInputTooLarge(
+            f"Too many edges to render: {len(rendered.edges)} after level of detail (limit {settings.max_spec_edges})"
+        )
+    labels = [rendered.diagram.name]
+    labels += [node.label for node in rendered.nodes]
+    labels += [cluster.name for cluster in rendered.clusters]
+    labels += [edge.label for edge in rendered.edges if edge.label]
+    longest = max(len(label) for label in labels)
+    if longest > settings.max_label_length:
+        raise RenderInputTooLarge(f"Label too long: {longest} characters (limit {settings.max_label_length})")
+
+def _resident_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is the peak, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _worker_main(conn, memory_limit_bytes: int, cpu_seconds: int) -> None:
+    """Render loop run in the sandbox process; Graphviz children inherit its rlimits"""
+    from app.services.diagram_service import DiagramService
+
+    # Own process group, so killing the worker also kills a runaway Graphviz child
+    os.setpgrp()
+    if memory_limit_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    service = DiagramService()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        spec_json, options_json = job
+        if cpu_seconds:
+            # The soft limit is absolute, so move it past the CPU time used by earlier jobs
+            used = resource.getrusage(resource.RUSAGE_SELF)
+            used_seconds = int(used.ru_utime + used.ru_stime)
+            resource.setrlimit(resource.RLIMIT_CPU, (used_seconds + cpu_seconds, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+        try:
+            png = service._render_png(
+                DiagramSpec.model_validate_json(spec_json),
+                RenderOptions.model_validate_json(options_json)
+            )
+            reply = ("ok", png)
+        except subprocess.CalledProcessError as e:
+            # A negative return code means Graphviz was killed by a signal (SIGXCPU, SIGKILL...)
+            kind = "limit" if e.returncode < 0 else "error"
+            reply = (kind, f"Graphviz failed with exit code {e.returncode}")
+        except MemoryError:
+            reply = ("limit", "Render exceeded the memory limit")
+        except (ValueError, KeyError, AttributeError) as e:
+            reply = ("invalid", str(e))
+        except Exception as e:
+            reply = ("error", str(e))
+        conn.send((*reply, _resident_bytes()))
+
+class _Worker:
+    def __init__(self, context, memory_limit_bytes: int, cpu_seconds: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_bytes, cpu_seconds),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def kill(self) -> None:
+        self.conn.close()
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.join(timeout=1)
+
+class RenderSandbox:
+    """Pool of render subprocesses with rlimits, a wall-clock timeout and recycling"""
+
+    def __init__(self, size: int, timeout: float, cpu_seconds: int, memory_limit_bytes: int,
+                 max_jobs: int, max_rss_bytes: int):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_limit_bytes = memory_limit_bytes
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            self._context.set_forkserver_preload(["app.services.diagram_service"])
+
+    def render(self, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        """Render the spec to PNG bytes in a sandbox worker"""
+        token = current_token()
+        # Wait for a free worker in short slices so a cancelled request leaves the queue
+        while not self._slots.acquire(timeout=CANCEL_POLL_SECONDS):
+            raise_if_cancelled("render_queue")
+        try:
+            raise_if_cancelled("render_queue")
+            worker = self._checkout()
+            try:
+                worker.conn.send((spec.model_dump_json(by_alias=True), options.model_dump_json()))
+                deadline = time.monotonic() + self.timeout
+                while not worker.conn.poll(CANCEL_POLL_SECONDS):
+                    if token is not None and token.cancelled:
+                        self._discard(worker, "cancelled")
+                        raise_if_cancelled("render")
+                    if time.monotonic() >= deadline:
+                        self._discard(worker, "timeout")
+                        raise RenderTimeout(f"Render exceeded {self.timeout:g}s")
+                kind, payload, rss = worker.conn.recv()
+            except (EOFError, OSError):
+                self._discard(worker, "crashed")
+                raise RenderLimitExceeded("Render worker was killed, likely by a resource limit")
+            except BaseException:
+                if worker.process.is_alive() and not worker.conn.closed:
+                    self._discard(worker, "interrupted")
+                raise
+
+            worker.jobs += 1
+            if worker.jobs >= self.max_jobs:
+                self._discard(worker, "max_jobs")
+            elif rss > self.max_rss_bytes:
+                self._discard(worker, "rss")
+            else:
+                self._idle.put(worker)
+        finally:
+            self._slots.release()
+
+        if kind == "ok":
+            return payload
+        metrics.inc("render_sandbox_failures_total", {"reason": kind})
+        if kind == "limit":
+            raise RenderLimitExceeded(payload)
+        if kind == "invalid":
+            raise ValueError(payload)
+        raise Exception(payload)
+
+    def _checkout(self) -> _Worker:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return _Worker(self._context, self.memory_limit_bytes, self.cpu_seconds)
+            if worker.process.is_alive():
+                return worker
+            worker.kill()
+
+    def _discard(self, worker: _Worker, reason: str) -> None:
+        logger.info(f"Recycling render worker {worker.process.pid} after {worker.jobs} jobs ({reason})")
+        metrics.inc("render_sandbox_recycled_total", {"reason": reason})
+        worker.kill()
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+@lru_cache()
+def get_render_sandbox() -> RenderSandbox:
+    settings = get_settings()
+    return RenderSandbox(
+        size=settings.render_pool_size,
+        timeout=settings.render_timeout_seconds,
+        cpu_seconds=settings.render_cpu_seconds,
+        memory_limit_bytes=settings.render_memory_limit_mb * 1024 * 1024,
+        max_jobs=settings.render_worker_max_jobs,
+        max_rss_bytes=settings.render_worker_max_rss_mb * 1024 * 1024
+    )
@@ -0,0 +1,369 @@
+import re
+import logging
+from collections import defaultdict
+from typing import List, Optional, Tuple
+from app.models.schemas import DiagramSpec
+
+logger = logging.getLogger(__name__)
+
+# Concepts and the node type used for each provider (aws is the fallback)
+CONCEPT_TYPES = {
+    "dns": {"aws": "aws.network.Route53", "gcp": "gcp.network.DNS"},
+    "cdn": {"aws": "aws.network.CloudFront", "gcp": "gcp.network.CDN", "azure": "azure.network.CDNProfiles"},
+    "api_gateway": {"aws": "aws.network.APIGateway", "azure": "azure.network.ApplicationGateway"},
+    "load_balancer": {"aws": "aws.network.ALB", "gcp": "gcp.network.LoadBalancing", "azure": "azure.network.LoadBalancers"},
+    "network_load_balancer": {"aws": "aws.network.NLB"},
+    "auth": {"aws": "aws.security.Cognito"},
+    "compute": {"aws": "aws.compute.EC2", "gcp": "gcp.compute.ComputeEngine", "azure": "azure.compute.VM"},
+    "service": {"aws": "aws.compute.ECS", "gcp": "gcp.compute.GKE", "azure": "azure.compute.AKS"},
+    "kubernetes": {"aws": "aws.compute.EKS", "gcp": "gcp.compute.GKE", "azure": "azure.compute.AKS"},
+    "function": {"aws": "aws.compute.Lambda", "gcp": "gcp.compute.Functions", "azure": "azure.compute.FunctionApps"},
+    "queue": {"aws": "aws.integration.SQS"},
+    "notifications": {"aws": "aws.integration.SNS"},
+    "cache": {"aws": "aws.database.ElastiCache"},
+    "database": {"aws": "aws.database.RDS", "gcp": "gcp.database.SQL", "azure": "azure.database.SQLDatabases"},
+    "nosql": {"aws": "aws.database.Dynamodb", "gcp": "gcp.database.Firestore", "azure": "azure.database.CosmosDb"},
+    "warehouse": {"aws": "aws.database.Redshift"},
+    "storage": {"aws": "aws.storage.S3", "gcp": "gcp.storage.GCS", "azure": "azure.storage.BlobStorage"},
+    "monitoring": {"aws": "aws.management.Cloudwatch"},
+    "audit": {"aws": "aws.management.Cloudtrail"},
+}
+
+# Phrases (matched longest first) and the concept and default label they stand for
+SYNONYMS = {
+    "route53": ("dns", "DNS"), "dns": ("dns", "DNS"),
+    "cloudfront": ("cdn", "CDN"), "cdn": ("cdn", "CDN"),
+    "api gateway": ("api_gateway", "API Gateway"), "gateway": ("api_gateway", "API Gateway"),
+    "application load balancer": ("load_balancer", "Load Balancer"),
+    "network load balancer": ("network_load_balancer", "Network Load Balancer"),
+    "load balancer": ("load_balancer", "Load Balancer"), "alb": ("load_balancer", "Load Balancer"),
+    "elb": ("load_balancer", "Load Balancer"), "nlb": ("network_load_balancer", "Network Load Balancer"),
+    "cognito": ("auth", "User Pool"), "user pool": ("auth", "User Pool"),
+    "ec2 instances": ("compute", "Web Server"), "ec2 instance": ("compute", "Web Server"), "ec2": ("compute", "Web Server"),
+    "web servers": ("compute", "Web Server"), "web server": ("compute", "Web Server"),
+    "app servers": ("compute", "App Server"), "app server": ("compute", "App Server"),
+    "servers": ("compute", "Server"), "server": ("compute", "Server"),
+    "virtual machines": ("compute", "VM"), "virtual machine": ("compute", "VM"), "vm": ("compute", "VM"),
+    "instances": ("compute", "Instance"), "instance": ("compute", "Instance"),
+    "microservices": ("service", "Service"), "services": ("service", "Service"), "service": ("service", "Service"),
+    "containers": ("service", "Container"), "ecs": ("service", "ECS Service"),
+    "kubernetes": ("kubernetes", "Kubernetes"), "eks": ("kubernetes", "EKS"), "gke": ("kubernetes", "GKE"), "aks": ("kubernetes", "AKS"),
+    "lambda functions": ("function", "Function"), "lambda": ("function", "Function"),
+    "functions": ("function", "Function"), "function": ("function", "Function"),
+    "sqs queue": ("queue", "Queue"), "sqs": ("queue", "Queue"), "message queue": ("queue", "Queue"), "queue": ("queue", "Queue"),
+    "sns": ("notifications", "Notifications"), "notifications": ("notifications", "Notifications"),
+    "elasticache": ("cache", "Cache"), "redis": ("cache", "Cache"), "memcached": ("cache", "Cache"), "cache": ("cache", "Cache"),
+    "rds database": ("database", "Database"), "rds": ("database", "Database"), "postgresql": ("database", "Database"),
+    "postgres": ("database", "Database"), "mysql": ("database", "Database"), "cloud sql": ("database", "Database"),
+    "databases": ("database", "Database"), "database": ("database", "Database"), "db": ("database", "Database"),
+    "dynamodb": ("nosql", "NoSQL Database"), "firestore": ("nosql", "NoSQL Database"), "cosmos db": ("nosql", "NoSQL Database"),
+    "nosql": ("nosql", "NoSQL Database"),
+    "redshift": ("warehouse", "Data Warehouse"), "data warehouse": ("warehouse", "Data Warehouse"),
+    "s3 bucket": ("storage", "Storage"), "s3": ("storage", "Storage"), "bucket": ("storage", "Storage"),
+    "object storage": ("storage", "Storage"), "blob storage": ("storage", "Storage"), "cloud storage": ("storage", "Storage"),
+    "cloudwatch": ("monitoring", "Monitoring"), "monitoring": ("monitoring", "Monitoring"),
+    "cloudtrail": ("audit", "Audit Log"),
+}
+
+# Request flow order used when the description has no explicit connection cues
+TIER_ORDER = [
+    ["dns"], ["cdn"], ["auth"], ["api_gateway", "load_balancer", "network_load_balancer"],
+    ["compute", "service", "kubernetes", "function"], ["queue", "notifications"],
+    ["cache", "database", "nosql", "warehouse", "storage"]
+]
+# Observability sinks receive edges from the compute tier
+SINK_CONCEPTS = {"monitoring", "audit"}
+
+# Words that carry no component information and do not lower confidence
+FILLER_WORDS = {
+    "a", "an", "and", "the", "with", "for", "of", "in", "on", "to", "by", "be", "is", "are", "as",
+    "should", "that", "this", "it", "its", "from", "into", "using", "use", "include", "including",
+    "add", "create", "design", "draw", "make", "build", "diagram", "showing", "show", "named", "called",
+    "cluster", "group", "basic", "simple", "web", "application", "app", "architecture", "system",
+    "storage", "routing", "message", "messages", "passing", "shared", "between", "behind", "then",
+    "connects", "connect", "connected", "talks", "sends", "writes", "reads", "via", "through", "all",
+    "each", "both", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "aws", "gcp", "azure", "google", "cloud", "amazon", "microsoft", "tier", "layer", "which",
+    "where", "will", "can", "also", "plus", "their", "them", "they", "static", "assets", "files", "data"
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+
+SYNONYM_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(s) for s in sorted(SYNONYMS, key=len, reverse=True)) + r")\b"
+)
+CLUSTER_PATTERN = re.compile(r"\b(?:in|into)\s+(?:a|an|the)?\s*cluster\s+(?:named|called)\s+['\"]([^'\"]+)['\"]", re.IGNORECASE)
+NAMED_SERVICE_PATTERN = re.compile(r"\b([a-z][a-z-]+)\s+(service|microservice)\b")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Words allowed between the items of a list of mentions ("S3 and DynamoDB", "a queue, a cache")
+LIST_WORDS = {"and", "or", "a", "an", "the"} | set(NUMBER_WORDS)
+SENTENCE_PATTERN = re.compile(r"(?<=[.;!?])\s+|\n+")
+# Edge cues: "A behind B" means traffic flows B -> A, the others flow left to right
+REVERSE_CUES = re.compile(r"\bbehind\b")
+FORWARD_CUES = re.compile(r"\b(?:then|connects? to|connected to|talks? to|sends? to|writes? to|reads? from|calls|forwards? to|routes? to)\b|->")
+
+# Phrases naming a role, so a second one of the same concept ("a web server and an app server")
+# is a separate node rather than a reference back to the first
+ROLE_PHRASES = {"web server", "web servers", "app server", "app servers"}
+# Order of role nodes of the same concept along the request flow
+ROLE_ORDER = {"Web Server": 0, "App Server": 1}
+
+NOT_SERVICE_NAMES = {"a", "an", "the", "each", "every", "one", "two", "three", "four", "five", "web", "micro", "of", "and"}
+
+class RuleBasedResult:
+    """Spec produced by the rule-based generator with a confidence estimate"""
+
+    def __init__(self, spec: Optional[DiagramSpec], confidence: float):
+        self.spec = spec
+        self.confidence = confidence
+
+def _detect_provider(text: str) -> str:
+    if re.search(r"\b(gcp|google cloud|gke|cloud sql|bigquery)\b", text):
+        return "gcp"
+    if re.search(r"\b(azure|aks|cosmos db)\b", text):
+        return "azure"
+    return "aws"
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_") or "node"
+
+class _Builder:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.nodes = []
+        self.nodes_by_concept = defaultdict(list)
+        # Nodes of each concept grouped by the label they were created for, in creation order
+        self.groups = defaultdict(dict)
+        self.named = set()
+        self.ids = set()
+        self.dropped = 0
+
+    def _new_id(self, label: str) -> str:
+        node_id = _slug(label)
+        suffix = 2
+        while node_id in self.ids:
+            node_id = f"{_slug(label)}_{suffix}"
+            suffix += 1
+        self.ids.add(node_id)
+        return node_id
+
+    def add(self, concept: str, label: str, group: Optional[str] = None) -> str:
+        node_id = self._new_id(label)
+        types = CONCEPT_TYPES[concept]
+        self.nodes.append({"id": node_id, "type": types.get(self.provider, types["aws"]), "label": label})
+        self.nodes_by_concept[concept].append(node_id)
+        self.groups[concept].setdefault(group or label, []).append(node_id)
+        return node_id
+
+    def add_group(self, concept: str, label: str, count: int) -> Tuple[str, str]:
+        for i in range(count):
+            self.add(concept, f"{label} {i + 1}" if count > 1 else label, label)
+        return concept, label
+
+    def resolve(self, concept: str, label: str, count: int, phrase: str) -> Tuple[str, Optional[str]]:
+        """Node group a mention refers to, creating or growing it; (concept, None) means every node of the concept"""
+        groups = self.groups[concept]
+        if not groups or (phrase in ROLE_PHRASES and label not in groups):
+            return self.add_group(concept, label, count)
+        if label not in groups and len(groups) > 1:
+            # "the services" after several named ones: fine unless it gives a different count
+            if count > 1 and count != len(self.nodes_by_concept[concept]):
+                self.dropped += 1
+            return concept, None
+        key = label if label in groups else next(iter(groups))
+        group = groups[key]
+        if count > len(group) and key not in self.named:
+            # "microservices ... with three services": the later count wins
+            self._grow(concept, key, count)
+        elif count > 1 and count != len(group):
+            self.dropped += 1
+        return concept, key
+
+    def _grow(self, concept: str, key: str, count: int) -> None:
+        group = self.groups[concept][key]
+        if len(group) == 1:
+            # The single node becomes the first of a numbered set
+            node = next(n for n in self.nodes if n["id"] == group[0])
+            self.ids.discard(node["id"])
+            node["label"] = f"{key} 1"
+            node["id"] = self._new_id(node["label"])
+            concept_nodes = self.nodes_by_concept[concept]
+            concept_nodes[concept_nodes.index(group[0])] = node["id"]
+            group[0] = node["id"]
+        for i in range(len(group), count):
+            self.add(concept, f"{key} {i + 1}", key)
+
+    def members(self, key: Tuple[str, Optional[str]]) -> List[str]:
+        concept, group = key
+        return self.nodes_by_concept[concept] if group is None else self.groups[concept][group]
+
+def _mentions(sentence: str) -> List[Tuple[int, str, str, int, str]]:
+    """Component mentions in a sentence as (position, concept, label, count, phrase)"""
+    mentions = []
+    for match in SYNONYM_PATTERN.finditer(sentence):
+        concept, label = SYNONYMS[match.group(1)]
+        preceding = WORD_PATTERN.findall(sentence[:match.start()])[-1:] or [""]
+        count = NUMBER_WORDS.get(preceding[0]) or (int(preceding[0]) if preceding[0].isdigit() else 1)
+        mentions.append((match.start(), concept, label, min(count, 20), match.group(1)))
+    return mentions
+
+def generate_rule_based_spec(description: str) -> RuleBasedResult:
+    """Build a DiagramSpec from a description with keyword rules, no LLM involved"""
+    text = description.strip()
+    lowered = text.lower()
+    builder = _Builder(_detect_provider(lowered))
+    original_sentences = [s for s in SENTENCE_PATTERN.split(text) if s.strip()]
+    sentences = [s.lower() for s in original_sentences]
+
+    # Named services ("an authentication service, a payment service") become one node each
+    named_services = [
+        m.group(1) for m in NAMED_SERVICE_PATTERN.finditer(lowered) if m.group(1) not in NOT_SERVICE_NAMES
+    ]
+    for name in dict.fromkeys(named_services):
+        label = f"{name.replace('-', ' ').title()} Service"
+        builder.add("service", label)
+        builder.named.add(label)
+
+    # Which node group each mention refers to, by (sentence index, position)
+    resolved = {}
+    cluster_sentences = []
+    for index, (original, sentence) in enumerate(zip(original_sentences, sentences)):
+        if CLUSTER_PATTERN.search(original):
+            cluster_sentences.append(original)
+            continue
+        for position, concept, label, count, phrase in _mentions(sentence):
+            resolved[(index, position)] = builder.resolve(concept, label, count, phrase)
+
+    # Cluster phrases group every node of the concepts mentioned in that sentence
+    clusters = []
+    clustered = set()
+    for sentence in cluster_sentences:
+        match = CLUSTER_PATTERN.search(sentence)
+        name = match.group(1).strip()
+        subject = (sentence[:match.start()] + sentence[match.end():]).lower()
+        members = []
+        for _, concept, label, count, _ in _mentions(subject):
+            if not builder.nodes_by_concept[concept]:
+                builder.add_group(concept, label, count)
+            members.extend(n for n in builder.nodes_by_concept[concept] if n not in clustered and n not in members)
+        if members:
+            clustered.update(members)
+            clusters.append({"id": _slug(name), "name": name, "nodes": members})
+
+    edges = _infer_edges(sentences, builder, resolved)
+    confidence = _confidence(lowered, builder, cluster_sentences, clusters, edges)
+
+    if not builder.nodes:
+        return RuleBasedResult(None, 0.0)
+
+    spec = DiagramSpec.model_validate({
+        "diagram": {"name": _title(text), "filename": "diagram", "show": False},
+        "nodes": builder.nodes,
+        "clusters": clusters,
+        "edges": edges
+    })
+    logger.info(f"Rule-based spec: {len(spec.nodes)} nodes, {len(spec.edges)} edges, confidence {confidence:.2f}")
+    return RuleBasedResult(spec, confidence)
+
+def _title(text: str) -> str:
+    words = WORD_PATTERN.findall(text.lower())
+    meaningful = [w for w in words if w not in FILLER_WORDS][:4]
+    return " ".join(w.capitalize() for w in meaningful) or "Architecture"
+
+def _infer_edges(sentences: List[str], builder: _Builder, resolved: dict) -> List[dict]:
+    edges = []
+    seen = set()
+
+    def connect(sources, targets):
+        for source in sources:
+            for target in targets:
+                if source != target and (source, target) not in seen:
+                    seen.add((source, target))
+                    edges.append({"from": source, "to": target})
+
+    # Explicit cues link the mentions on either side of the cue, in sentence order
+    explicit = set()
+    for index, sentence in enumerate(sentences):
+        mentions = [
+            (position, position + len(phrase), resolved.get((index, position), (concept, None)))
+            for position, concept, _, _, phrase in _mentions(sentence)
+        ]
+        cues = sorted(
+            (cue.start(), cue.end(), reverse)
+            for pattern, reverse in ((REVERSE_CUES, True), (FORWARD_CUES, False))
+            for cue in pattern.finditer(sentence)
+        )
+        downstream = None
+        for i, (start, end, reverse) in enumerate(cues):
+            low = cues[i - 1][1] if i else 0
+            high = cues[i + 1][0] if i + 1 < len(cues) else len(sentence)
+            before = [key for position, _, key in mentions if low <= position < start]
+            after = _leading_list(sentence, [m for m in mentions if end <= m[0] < high])
+            if not after or not (before or downstream):
+                downstream = None
+                continue
+            # "A behind B, then C": C continues from A, the end of the flow so far, not from B
+            left = downstream if downstream is not None and len(before) <= 1 else before[-1]
+            # "writes to S3 and DynamoDB": every item of a list right after the cue is a target
+            for right in after:
+                source, target = (right, left) if reverse else (left, right)
+                connect(builder.members(source), builder.members(target))
+                explicit.update({left[0], right[0]})
+            downstream = left if reverse else after[0]
+
+    # Everything else follows the usual request flow from edge to data tier
+    stages = []
+    for tier in TIER_ORDER:
+        concepts = [c for c in tier if builder.nodes_by_concept[c] and c not in explicit]
+        if concepts == ["compute"] and len(builder.groups["compute"]) > 1:
+            # Web servers in front of app servers
+            roles = sorted(builder.groups["compute"], key=lambda label: ROLE_ORDER.get(label, 0))
+            stages.extend(builder.groups["compute"][role] for role in roles)
+        elif concepts:
+            stages.append([n for c in concepts for n in builder.nodes_by_concept[c]])
+    for upstream, downstream in zip(stages, stages[1:]):
+        connect(upstream, downstream)
+
+    compute = [n for c in ("compute", "service", "kubernetes", "function") for n in builder.nodes_by_concept[c]]
+    for sink in SINK_CONCEPTS:
+        connect(compute, builder.nodes_by_concept[sink])
+    return edges
+
+def _leading_list(sentence: str, mentions: list) -> list:
+    """Keys of the first mention and of those joined to it as a list ("S3 and DynamoDB")"""
+    keys = []
+    for i, (position, _, key) in enumerate(mentions):
+        if i and not all(word in LIST_WORDS or word.isdigit() for word in WORD_PATTERN.findall(sentence[mentions[i - 1][1]:position])):
+            break
+        keys.append(key)
+    return list(dict.fromkeys(keys))
+
+def _confidence(lowered: str, builder: _Builder, cluster_sentences: list, clusters: list, edges: list) -> float:
+    """Share of meaningful words the rules understood, penalizing unresolved clusters,
+    mentions that did not fit the nodes built so far, and nodes left without edges"""
+    if not builder.nodes:
+        return 0.0
+    matched = set()
+    for match in SYNONYM_PATTERN.finditer(lowered):
+        matched.update(WORD_PATTERN.findall(match.group(1)))
+    for node in builder.nodes:
+        matched.update(WORD_PATTERN.findall(node["label"].lower()))
+    for cluster in clusters:
+        matched.update(WORD_PATTERN.findall(cluster["name"].lower()))
+
+    words = [w for w in WORD_PATTERN.findall(lowered) if w not in FILLER_WORDS and not w.isdigit()]
+    if not words:
+        return 0.0
+    understood = sum(1 for w in words if w in matched)
+    confidence = understood / len(words)
+    if len(clusters) < len(cluster_sentences):
+        confidence *= 0.5
+    if builder.dropped:
+        confidence *= 0.5
+    if len(builder.nodes) > 1:
+        connected = {e["from"] for e in edges} | {e["to"] for e in edges}
+        isolated = sum(1 for node in builder.nodes if node["id"] not in connected)
+        confidence *= 1 - isolated / len(builder.nodes)
+    return round(confidence, 3)
\ No newline at end of file
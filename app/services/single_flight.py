@@ -0,0 +1,62 @@
+import logging
+import threading
+from typing import Callable, TypeVar
+from app.core.metrics import metrics
+from app.core.cancellation import SharedCancelToken, current_token, raise_if_cancelled, use_token
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How often a waiting duplicate checks whether its own client has gone away
+WAIT_POLL_SECONDS = 0.1
+
+class _Call:
+    def __init__(self, token: SharedCancelToken):
+        self.token = token
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution whose result all callers share"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        token = current_token()
+        with self._lock:
+            call = self._calls.get(key)
+            # A call whose waiters have all gone is about to abort, so start a fresh one
+            leader = call is None or call.token.cancelled
+            if leader:
+                call = _Call(SharedCancelToken(token))
+                self._calls[key] = call
+            else:
+                call.token.add(token)
+        metrics.inc("single_flight_calls_total", {"flight": self.name, "role": "leader" if leader else "follower"})
+
+        if leader:
+            # The shared work keeps running while any waiter is still connected
+            try:
+                with use_token(call.token):
+                    call.result = func()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+            if call.token.waiters > 1:
+                logger.info(f"Single-flight {self.name} shared one result with {call.token.waiters} callers")
+        else:
+            while not call.done.wait(WAIT_POLL_SECONDS):
+                raise_if_cancelled(f"{self.name}_wait")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
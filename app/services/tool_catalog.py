@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import math
+import inspect
+import hashlib
+import logging
+import pkgutil
+import importlib
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import lru_cache
+from importlib.metadata import version, PackageNotFoundError
+from typing import List, Optional
+import diagrams
+from app.core.config import get_settings
+from app.services.diagram_tools import DIAGRAM_TOOLS
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FORMAT = 1
+
+# Ranking boost for hand-curated tools so they win ties against obscure icons
+CURATED_BOOST = 2.0
+
+# Request phrasing that carries no signal about node types
+STOP_WORDS = {
+    "a", "an", "and", "the", "with", "for", "of", "in", "on", "to", "by", "be", "is", "are",
+    "should", "that", "this", "it", "its", "as", "from", "into", "using", "use", "include",
+    "create", "design", "diagram", "showing", "show", "named", "called", "cluster", "group",
+    "basic", "simple", "two", "three", "four", "some", "all", "each", "between"
+}
+
+# Abbreviations and short forms people write, mapped to the words node names use
+SYNONYMS = {
+    "k8s": ["kubernetes"],
+    "kube": ["kubernetes"],
+    "postgres": ["postgresql"],
+    "pg": ["postgresql"],
+    "psql": ["postgresql"],
+    "mongo": ["mongodb"],
+    "db": ["database"],
+    "lb": ["load", "balancer"],
+    "loadbalancer": ["load", "balancer"],
+    "webserver": ["web", "server"],
+    "es": ["elasticsearch"],
+    "mq": ["queue"],
+    "vm": ["vm", "virtual", "machine"],
+}
+
+# Query words this long also match longer index words they start with ("mongo" -> "mongodb")
+MIN_PREFIX_LENGTH = 4
+PREFIX_WEIGHT = 0.5
+
+# Providers of the curated tools, listed first when browsing the catalog
+CORE_PROVIDERS = ("aws", "gcp", "azure")
+
+# Words in CamelCase identifiers and free text: "APIGateway" -> "API", "Gateway"
+WORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b|_)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+RAW_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Split CamelCase identifiers and free text into lowercase tokens, expanding synonyms"""
+    tokens = []
+    for word in RAW_WORD_PATTERN.findall(text):
+        synonyms = SYNONYMS.get(word.lower())
+        if synonyms:
+            tokens.extend(synonyms)
+        else:
+            tokens.extend(w.lower() for w in WORD_PATTERN.findall(word))
+    return tokens
+
+def humanize(name: str) -> str:
+    return " ".join(WORD_PATTERN.findall(name))
+
+def _diagrams_version() -> str:
+    try:
+        return version("diagrams")
+    except PackageNotFoundError:
+        return "unknown"
+
+def scan_providers() -> List[dict]:
+    """Scan the installed diagrams providers for every concrete node class"""
+    curated = DIAGRAM_TOOLS
+    entries = []
+    for provider in pkgutil.iter_modules(diagrams.__path__):
+        if not provider.ispkg:
+            continue
+        package = importlib.import_module(f"diagrams.{provider.name}")
+        for category in pkgutil.iter_modules(package.__path__):
+            module_name = f"diagrams.{provider.name}.{category.name}"
+            try:
+                module = importlib.import_module(module_name)
+            except Exception as e:
+                logger.warning(f"Skipping {module_name}: {e}")
+                continue
+
+            # Aliases (ALB = ElbApplicationLoadBalancer) point at the same class
+            names_by_class = defaultdict(list)
+            for name, obj in vars(module).items():
+                if (inspect.isclass(obj) and issubclass(obj, diagrams.Node)
+                        and obj.__module__ == module_name and getattr(obj, "_icon", None)):
+                    names_by_class[obj].append(name)
+
+            for cls, names in names_by_class.items():
+                paths = [f"{provider.name}.{category.name}.{name}" for name in names]
+                curated_path = next((p for p in paths if p in curated), None)
+                aliases = [name for name in names if name != cls.__name__]
+                entries.append({
+                    "type": curated_path or f"{provider.name}.{category.name}.{cls.__name__}",
+                    "provider": provider.name,
+                    "category": category.name,
+                    "description": curated[curated_path] if curated_path else humanize(cls.__name__),
+                    "aliases": aliases,
+                    "curated": curated_path is not None
+                })
+
+    entries.sort(key=lambda e: e["type"])
+    return entries
+
+def catalog_order(entry: dict) -> tuple:
+    """Curated tools first, then the rest of the core providers, then everything else"""
+    provider = entry["provider"]
+    rank = CORE_PROVIDERS.index(provider) if provider in CORE_PROVIDERS else len(CORE_PROVIDERS)
+    return (not entry["curated"], rank, entry["type"])
+
+class ToolCatalog:
+    """Searchable TF-IDF index over every diagrams node type"""
+
+    def __init__(self, entries: List[dict]):
+        self.entries = sorted(entries, key=catalog_order)
+        entries = self.entries
+        self.by_type = {e["type"]: e for e in entries}
+        self.etag = hashlib.sha256(json.dumps(entries, sort_keys=True).encode()).hexdigest()[:32]
+
+        documents = [self._document_tokens(e) for e in entries]
+        doc_freq = Counter(token for tokens in documents for token in set(tokens))
+        total = len(documents)
+        self.idf = {token: math.log((1 + total) / (1 + df)) + 1 for token, df in doc_freq.items()}
+        self.vocabulary = sorted(self.idf)
+
+        # Inverted index of L2-normalized tf-idf weights
+        self.postings = defaultdict(list)
+        for index, tokens in enumerate(documents):
+            counts = Counter(tokens)
+            weights = {t: c * self.idf[t] for t, c in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for token, weight in weights.items():
+                self.postings[token].append((index, weight / norm))
+
+    @staticmethod
+    def _document_tokens(entry: dict) -> List[str]:
+        text = " ".join([entry["type"].replace(".", " "), entry["description"], *entry["aliases"]])
+        return tokenize(text)
+
+    def _expand(self, term: str) -> dict:
+        """Index tokens a query term matches, with a weight for inexact matches"""
+        matches = {}
+        if term in self.idf:
+            matches[term] = 1.0
+        if term.endswith("s") and term[:-1] in self.idf:
+            matches[term[:-1]] = 1.0
+        if len(term) >= MIN_PREFIX_LENGTH:
+            for token in self.vocabulary[bisect_left(self.vocabulary, term):]:
+                if not token.startswith(term):
+                    break
+                matches.setdefault(token, PREFIX_WEIGHT)
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None, provider: Optional[str] = None) -> List[dict]:
+        """Rank entries by tf-idf similarity to the query"""
+        query_weights = defaultdict(float)
+        for term, count in Counter(t for t in tokenize(query) if t not in STOP_WORDS).items():
+            for token, factor in self._expand(term).items():
+                query_weights[token] = max(query_weights[token], count * factor)
+
+        scores = defaultdict(float)
+        for token, query_weight in query_weights.items():
+            idf = self.idf[token]
+            for index, weight in self.postings[token]:
+                scores[index] += query_weight * idf * weight
+
+        ranked = []
+        for index, score in scores.items():
+            entry = self.entries[index]
+            if provider and entry["provider"] != provider:
+                continue
+            ranked.append((score * (CURATED_BOOST if entry["curated"] else 1.0), entry["type"], entry))
+        ranked.sort(key=lambda r: (-r[0], r[1]))
+        results = [entry for _, _, entry in ranked]
+        return results[:limit] if limit else results
+
+    def filter(self, provider: Optional[str] = None) -> List[dict]:
+        if not provider:
+            return self.entries
+        return [e for e in self.entries if e["provider"] == provider]
+
+def _load_index(path: str) -> Optional[List[dict]]:
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("format") != CATALOG_FORMAT or index.get("diagrams_version") != _diagrams_version():
+        logger.info("Tool catalog index is stale, rebuilding")
+        return None
+    return index["entries"]
+
+def _save_index(path: str, entries: List[dict]) -> None:
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"format": CATALOG_FORMAT, "diagrams_version": _diagrams_version(), "entries": entries},
+                f,
+                separators=(",", ":")
+            )
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not persist tool catalog to {path}: {e}")
+
+@lru_cache()
+def get_catalog() -> ToolCatalog:
+    """Load the persisted catalog index, scanning the diagrams providers if needed"""
+    path = get_settings().tool_catalog_path
+    entries = _load_index(path)
+    if entries is None:
+        entries = scan_providers()
+        _save_index(path, entries)
+        logger.info(f"Built tool catalog with {len(entries)} node types")
+    else:
+        logger.info(f"Loaded tool catalog with {len(entries)} node types")
+    return ToolCatalog(entries)
+
+def select_prompt_tools(description: str, top_k: Optional[int] = None) -> dict:
+    """Curated core tools, plus the node types most relevant to a description up to top_k in total"""
+    top_k = top_k or get_settings().prompt_tool_top_k
+    tools = dict(DIAGRAM_TOOLS)
+    for entry in get_catalog().search(description):
+        if len(tools) >= top_k:
+            break
+        tools.setdefault(entry["type"], entry["description"])
+    return tools
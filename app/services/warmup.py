@@ -0,0 +1,89 @@
+import time
+import logging
+import threading
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.diagram_service import DiagramService
+from app.services.diagram_tools import import_tool_modules
+from app.services.icon_assets import prepare_icons
+from app.services.llm_service import get_openai_client
+from app.services.tool_catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+# Canonical spec rendered once at startup to prime Graphviz and the font caches
+SAMPLE_SPEC = DiagramSpec.model_validate({
+    "diagram": {"name": "Warm-up", "filename": "warmup", "show": False},
+    "nodes": [
+        {"id": "lb", "type": "aws.network.ALB", "label": "Load Balancer"},
+        {"id": "web1", "type": "aws.compute.EC2", "label": "Web 1"},
+        {"id": "web2", "type": "aws.compute.EC2", "label": "Web 2"},
+        {"id": "db", "type": "aws.database.RDS", "label": "Database"}
+    ],
+    "clusters": [
+        {"id": "web_tier", "name": "Web Tier", "nodes": ["web1", "web2"]}
+    ],
+    "edges": [
+        {"from": "lb", "to": "web1"},
+        {"from": "lb", "to": "web2"},
+        {"from": "web1", "to": "db"},
+        {"from": "web2", "to": "db"}
+    ]
+})
+
+_ready = threading.Event()
+warmup_status = {"steps": {}, "error": None, "duration_seconds": None}
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def mark_ready() -> None:
+    _ready.set()
+
+def run_warmup() -> None:
+    """Import providers, render a sample diagram and open the LLM connection pool"""
+    settings = get_settings()
+    started = time.perf_counter()
+    logger.info("Warm-up started")
+
+    try:
+        step_started = time.perf_counter()
+        modules = import_tool_modules()
+        warmup_status["steps"]["import_providers"] = round(time.perf_counter() - step_started, 3)
+        logger.info(f"Warm-up: imported {len(modules)} provider modules")
+
+        step_started = time.perf_counter()
+        catalog = get_catalog()
+        warmup_status["steps"]["tool_catalog"] = round(time.perf_counter() - step_started, 3)
+        logger.info(f"Warm-up: loaded tool catalog ({len(catalog.entries)} node types)")
+
+        step_started = time.perf_counter()
+        icons = prepare_icons() if settings.icon_cache_enabled else []
+        warmup_status["steps"]["icon_assets"] = round(time.perf_counter() - step_started, 3)
+        logger.info(f"Warm-up: prepared {len(icons)} scaled icons")
+
+        # Bypass the render cache: every worker has to prime its own Graphviz state.
+        # Remote render workers prime themselves, and the API process never runs Graphviz
+        if settings.render_backend != "remote":
+            step_started = time.perf_counter()
+            DiagramService().render_image(SAMPLE_SPEC, RenderOptions(), use_cache=False)
+            warmup_status["steps"]["render_sample"] = round(time.perf_counter() - step_started, 3)
+            logger.info("Warm-up: rendered sample diagram")
+    except Exception as e:
+        warmup_status["error"] = str(e)
+        logger.error(f"Warm-up failed, staying not ready: {e}")
+        return
+
+    if settings.is_openrouter_configured:
+        # LLM availability is not a readiness condition: specs can still be rendered
+        step_started = time.perf_counter()
+        try:
+            get_openai_client().with_options(timeout=10.0).models.list()
+            warmup_status["steps"]["llm_connection"] = round(time.perf_counter() - step_started, 3)
+            logger.info("Warm-up: opened LLM connection pool")
+        except Exception as e:
+            logger.warning(f"Warm-up: LLM connection failed: {e}")
+
+    warmup_status["duration_seconds"] = round(time.perf_counter() - started, 3)
+    mark_ready()
+    logger.info(f"Warm-up finished in {warmup_status['duration_seconds']}s")
\ No newline at end of file
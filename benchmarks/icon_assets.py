@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pre-scaled icon cache: icon bytes and pixels Graphviz has to decode,
+and end-to-end render time with and without the cache (needs Graphviz installed).
+
+Run from the repository root: python benchmarks/icon_assets.py [nodes] [repeats]
+"""
+import os
+import sys
+import shutil
+import timeit
+import importlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.diagram_service import DiagramService
+from app.services.diagram_tools import DIAGRAM_TOOLS
+from app.services.icon_assets import DEFAULT_DPI, icon_source, prepare_icons, scaled_icon
+
+def node_class(type_path: str):
+    provider, module, cls_name = type_path.split(".")
+    return getattr(importlib.import_module(f"diagrams.{provider}.{module}"), cls_name)
+
+def sample_spec(nodes: int) -> DiagramSpec:
+    types = list(DIAGRAM_TOOLS)
+    return DiagramSpec.model_validate({
+        "diagram": {"name": "Icon Benchmark", "filename": "diagram", "show": False},
+        "nodes": [{"id": f"n{i}", "type": types[i % len(types)], "label": f"Node {i}"} for i in range(nodes)],
+        "edges": [{"from": f"n{i}", "to": f"n{i + 1}"} for i in range(nodes - 1)]
+    })
+
+def decode(paths: list) -> None:
+    for path in paths:
+        with Image.open(path) as image:
+            image.load()
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    settings = get_settings()
+    prepare_icons(dpis=[DEFAULT_DPI])
+
+    spec = sample_spec(nodes)
+    classes = [node_class(node.type) for node in spec.nodes]
+    sources = [icon_source(cls) for cls in classes]
+    scaled = [scaled_icon(cls, DEFAULT_DPI) for cls in classes]
+
+    def pixels(paths):
+        total = 0
+        for path in paths:
+            with Image.open(path) as image:
+                total += image.width * image.height
+        return total
+
+    print(f"Icons referenced by a {nodes}-node diagram at {DEFAULT_DPI} dpi")
+    print(f"  {'':<10} {'bytes':>12} {'pixels':>12} {'decode (ms)':>12}")
+    for label, paths in (("original", sources), ("scaled", scaled)):
+        size = sum(os.path.getsize(path) for path in paths)
+        seconds = min(timeit.repeat(lambda: decode(paths), number=1, repeat=5))
+        print(f"  {label:<10} {size:>12} {pixels(paths):>12} {seconds * 1000:>12.1f}")
+    print(f"  {len(set(scaled))} distinct scaled files for {len(set(sources))} source icons")
+
+    if shutil.which("dot") is None:
+        print("\nGraphviz not found on PATH; skipping render timing")
+        return
+
+    # Time raw Graphviz renders only: no sandbox, no layout reuse
+    settings.render_sandbox_enabled = False
+    settings.layout_cache_enabled = False
+    service = DiagramService()
+    print(f"\nRender time ({nodes} nodes, best of {repeats})")
+    results = {}
+    for enabled in (False, True):
+        settings.icon_cache_enabled = enabled
+        seconds = min(timeit.repeat(lambda: service._render_png(spec, RenderOptions()), number=1, repeat=repeats))
+        results[enabled] = seconds
+        print(f"  icon cache {'on ' if enabled else 'off'}  {seconds * 1000:10.1f} ms")
+    print(f"  speedup: {results[False] / results[True]:.2f}x")
+
+if __name__ == "__main__":
+    main()
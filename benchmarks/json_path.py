@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark the JSON hot paths: parsing LLM output into a DiagramSpec, and
+serializing a large base64 image as a response model and as an NDJSON stream event.
+
+Run from the repository root: python benchmarks/json_path.py
+"""
+import os
+import sys
+import json
+import base64
+import timeit
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.models.schemas import DiagramSpec, DiagramResponse
+from app.services.llm_service import json_bounds
+
+def sample_llm_reply(nodes: int = 40) -> str:
+    spec = {
+        "diagram": {"name": "Microservices", "filename": "diagram", "show": False},
+        "nodes": [{"id": f"svc_{i}", "type": "aws.compute.ECS", "label": f"Service {i}"} for i in range(nodes)],
+        "clusters": [{"id": "services", "name": "Services", "nodes": [f"svc_{i}" for i in range(nodes)]}],
+        "edges": [{"from": f"svc_{i}", "to": f"svc_{i + 1}"} for i in range(nodes - 1)]
+    }
+    return "```json\n" + json.dumps(spec, indent=2) + "\n```\n"
+
+def parse_legacy(response_text: str) -> DiagramSpec:
+    """The previous path: strip, slice fences, json.loads, build the model from the dict"""
+    response_text = response_text.strip()
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]
+    if response_text.startswith('```'):
+        response_text = response_text[3:]
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]
+    response_text = response_text.strip()
+    spec_dict = json.loads(response_text)
+    return DiagramSpec(**spec_dict)
+
+def parse_fast(response_text: str) -> DiagramSpec:
+    start, end = json_bounds(response_text)
+    return DiagramSpec.model_validate_json(response_text[start:end])
+
+def bench(label: str, func, number: int) -> float:
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<28} {seconds * 1e6:10.1f} µs")
+    return seconds
+
+def main():
+    reply = sample_llm_reply()
+    assert parse_legacy(reply) == parse_fast(reply)
+    print(f"Spec parsing ({len(reply)} byte reply)")
+    legacy = bench("json.loads + DiagramSpec(**)", lambda: parse_legacy(reply), 2000)
+    fast = bench("model_validate_json", lambda: parse_fast(reply), 2000)
+    print(f"  speedup: {legacy / fast:.1f}x")
+
+    image_data = base64.b64encode(os.urandom(300 * 1024)).decode()
+    response = DiagramResponse(image_data=image_data, message="Diagram generated successfully by agent")
+    # Both sides produce the same compact JSON bytes that go on the wire
+    legacy_body = lambda: JSONResponse(jsonable_encoder(response)).body
+    fast_body = lambda: response.model_dump_json().encode()
+    assert json.loads(legacy_body()) == json.loads(fast_body())
+    print(f"\nResponse model ({len(image_data)} byte base64 image)")
+    # Older FastAPI runs jsonable_encoder + json.dumps; current FastAPI dumps the model with Pydantic
+    legacy = bench("jsonable_encoder + json", legacy_body, 500)
+    fast = bench("model_dump_json", fast_body, 500)
+    print(f"  speedup: {legacy / fast:.1f}x")
+
+    event = {"event": "image", **response.model_dump()}
+    legacy_line = lambda: (json.dumps(event, separators=(",", ":")) + "\n").encode()
+    fast_line = lambda: orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+    assert legacy_line() == fast_line()
+    print("\nNDJSON stream event")
+    legacy = bench("json.dumps", legacy_line, 500)
+    fast = bench("orjson.dumps", fast_line, 500)
+    print(f"  speedup: {legacy / fast:.1f}x")
+
+if __name__ == "__main__":
+    main()
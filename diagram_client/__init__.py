@@ -0,0 +1,7 @@
+"""
+Python client for the Diagram API
+"""
+from diagram_client.client import DiagramClient, AsyncDiagramClient, DiagramAPIError
+from diagram_client.cache import ImageCache, spec_key
+
+__all__ = ["DiagramClient", "AsyncDiagramClient", "DiagramAPIError", "ImageCache", "spec_key"]
\ No newline at end of file
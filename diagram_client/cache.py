@@ -0,0 +1,50 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+def to_payload(spec) -> dict:
+    """Accept a plain dict or a DiagramSpec model"""
+    if hasattr(spec, "model_dump"):
+        return spec.model_dump(by_alias=True)
+    return spec
+
+def spec_key(spec, options: Optional[dict] = None) -> str:
+    """Hash of the canonical JSON form of a spec and its render options"""
+    canonical = json.dumps(
+        {"spec": to_payload(spec), "options": options or {}},
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class ImageCache:
+    """Local on-disk cache of rendered images keyed by spec hash"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.img")
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        # Write then rename so concurrent readers never see partial files
+        # mkstemp gives each writer its own temp file, including threads of one process
+        path = self._path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(temp_path, path)
+        logger.debug(f"Cached image {key} ({len(value)} bytes)")
\ No newline at end of file
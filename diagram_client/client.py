@@ -0,0 +1,284 @@
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+import httpx
+from diagram_client.cache import ImageCache, spec_key, to_payload
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 503}
+# Transport errors raised before the request reached the server; anything else may have been processed
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+IMAGE_MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+class DiagramAPIError(Exception):
+    """Raised when the Diagram API returns an error response"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+class _BaseClient:
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: float = 180.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_connections: int = 32,
+        cache_dir: Optional[str] = None
+    ):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=5.0)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = ImageCache(cache_dir) if cache_dir else None
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Honor Retry-After, otherwise exponential backoff with jitter"""
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _should_retry(self, attempt: int, response: Optional[httpx.Response],
+                      error: Optional[Exception] = None, idempotent: bool = True) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            # A POST that may have reached the server is not resent: it could run the LLM twice
+            return idempotent or isinstance(error, NOT_SENT_ERRORS)
+        return response.status_code in RETRY_STATUS_CODES
+
+    @staticmethod
+    def _check(response: httpx.Response) -> httpx.Response:
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise DiagramAPIError(response.status_code, str(detail))
+        return response
+
+    @staticmethod
+    def _image_request(options: Optional[dict]) -> tuple:
+        options = options or {}
+        media_type = IMAGE_MEDIA_TYPES[options.get("format", "png")]
+        return options, {"Accept": media_type}
+
+class DiagramClient(_BaseClient):
+    """Synchronous client for the Diagram API on a pooled keep-alive connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._http.close()
+
+    def _request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, None, e, idempotent):
+                    raise
+                logger.warning(f"{method} {path} failed ({e}), retrying")
+            else:
+                if not self._should_retry(attempt, response):
+                    return self._check(response)
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def generate(self, description: str, options: Optional[dict] = None) -> dict:
+        """Generate a diagram; returns the JSON response with base64 image data"""
+        return self._request("POST", "/generate-diagram", json={"description": description, "options": options}).json()
+
+    def generate_image(self, description: str, options: Optional[dict] = None) -> bytes:
+        """Generate a diagram and download the image bytes directly"""
+        options, headers = self._image_request(options)
+        response = self._request(
+            "POST", "/generate-diagram", json={"description": description, "options": options}, headers=headers
+        )
+        return response.content
+
+    def render(self, spec, options: Optional[dict] = None) -> dict:
+        """Render an existing spec; returns the JSON response with base64 image data"""
+        response = self._request(
+            "POST", "/render-diagram", idempotent=True, json={"spec": to_payload(spec), "options": options}
+        )
+        return response.json()
+
+    def render_image(self, spec, options: Optional[dict] = None) -> bytes:
+        """Render an existing spec to image bytes, using the local cache if configured"""
+        key = spec_key(spec, options)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        options, headers = self._image_request(options)
+        response = self._request(
+            "POST", "/render-diagram", idempotent=True, json={"spec": to_payload(spec), "options": options}, headers=headers
+        )
+        if self.cache is not None:
+            self.cache.set(key, response.content)
+        return response.content
+
+    def fetch_image(self, image_url: str) -> bytes:
+        """Download an image returned by reference (options={"delivery": "url"})"""
+        return self._request("GET", image_url).content
+
+    def debug_spec(self, description: str) -> dict:
+        return self._request("POST", "/debug-spec", json={"description": description}).json()["specification"]
+
+    def assistant(self, message: str, context: Optional[str] = None) -> dict:
+        return self._request("POST", "/assistant", json={"message": message, "context": context}).json()
+
+    def tools(self) -> dict:
+        return self._request("GET", "/tools").json()
+
+    def ready(self) -> bool:
+        return self._http.get("/ready").status_code == 200
+
+    def generate_many(self, descriptions: List[str], options: Optional[dict] = None, concurrency: int = 8) -> List[bytes]:
+        """Generate images for many descriptions with bounded concurrency, preserving order"""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda d: self.generate_image(d, options), descriptions))
+
+    def render_many(self, specs: list, options: Optional[dict] = None, concurrency: int = 8) -> List[bytes]:
+        """Render many specs with bounded concurrency, preserving order"""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda s: self.render_image(s, options), specs))
+
+class AsyncDiagramClient(_BaseClient):
+    """Asynchronous client for the Diagram API on a pooled keep-alive connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def _request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, None, e, idempotent):
+                    raise
+                logger.warning(f"{method} {path} failed ({e}), retrying")
+            else:
+                if not self._should_retry(attempt, response):
+                    return self._check(response)
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def generate(self, description: str, options: Optional[dict] = None) -> dict:
+        """Generate a diagram; returns the JSON response with base64 image data"""
+        response = await self._request("POST", "/generate-diagram", json={"description": description, "options": options})
+        return response.json()
+
+    async def generate_image(self, description: str, options: Optional[dict] = None) -> bytes:
+        """Generate a diagram and download the image bytes directly"""
+        options, headers = self._image_request(options)
+        response = await self._request(
+            "POST", "/generate-diagram", json={"description": description, "options": options}, headers=headers
+        )
+        return response.content
+
+    async def render(self, spec, options: Optional[dict] = None) -> dict:
+        """Render an existing spec; returns the JSON response with base64 image data"""
+        response = await self._request(
+            "POST", "/render-diagram", idempotent=True, json={"spec": to_payload(spec), "options": options}
+        )
+        return response.json()
+
+    async def render_image(self, spec, options: Optional[dict] = None) -> bytes:
+        """Render an existing spec to image bytes, using the local cache if configured"""
+        key = spec_key(spec, options)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        options, headers = self._image_request(options)
+        response = await self._request(
+            "POST", "/render-diagram", idempotent=True, json={"spec": to_payload(spec), "options": options}, headers=headers
+        )
+        if self.cache is not None:
+            self.cache.set(key, response.content)
+        return response.content
+
+    async def fetch_image(self, image_url: str) -> bytes:
+        """Download an image returned by reference (options={"delivery": "url"})"""
+        response = await self._request("GET", image_url)
+        return response.content
+
+    async def debug_spec(self, description: str) -> dict:
+        response = await self._request("POST", "/debug-spec", json={"description": description})
+        return response.json()["specification"]
+
+    async def assistant(self, message: str, context: Optional[str] = None) -> dict:
+        response = await self._request("POST", "/assistant", json={"message": message, "context": context})
+        return response.json()
+
+    async def tools(self) -> dict:
+        response = await self._request("GET", "/tools")
+        return response.json()
+
+    async def ready(self) -> bool:
+        response = await self._http.get("/ready")
+        return response.status_code == 200
+
+    async def _bounded(self, calls: list, concurrency: int) -> list:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(call):
+            async with semaphore:
+                return await call()
+
+        return await asyncio.gather(*(run(call) for call in calls))
+
+    async def generate_many(self, descriptions: List[str], options: Optional[dict] = None, concurrency: int = 8) -> List[bytes]:
+        """Generate images for many descriptions with bounded concurrency, preserving order"""
+        return await self._bounded(
+            [lambda d=d: self.generate_image(d, options) for d in descriptions], concurrency
+        )
+
+    async def render_many(self, specs: list, options: Optional[dict] = None, concurrency: int = 8) -> List[bytes]:
+        """Render many specs with bounded concurrency, preserving order"""
+        return await self._bounded(
+            [lambda s=s: self.render_image(s, options) for s in specs], concurrency
+        )
\ No newline at end of file
@@ -2,29 +2,42 @@
 """
 Gradio web interface for the Diagram API Assistant
 """
+import os
+import json
 import base64
 import io
 import gradio as gr
-import requests
+import httpx
 from PIL import Image
 import logging
 
 logger = logging.getLogger(__name__)
 
 # API Configuration
-API_BASE_URL = "http://localhost:8000"
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "180"))
+CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "16"))
+
+CONNECTION_ERROR = f"❌ Cannot connect to the API server. Make sure it's running on {API_BASE_URL}"
 
 class DiagramAssistant:
+    """Stateless API client; per-user history lives in gr.State"""
+
     def __init__(self):
-        self.conversation_history = []
+        # One keep-alive connection pool shared by every browser session
+        self.client = httpx.AsyncClient(
+            base_url=API_BASE_URL,
+            timeout=httpx.Timeout(API_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=CONCURRENCY_LIMIT * 2, max_keepalive_connections=CONCURRENCY_LIMIT)
+        )
     
-    def chat_with_assistant(self, message, history):
+    async def chat_with_assistant(self, message, conversation_history):
         """Chat with the assistant and handle diagram generation"""
         try:
             # Call the assistant endpoint
-            response = requests.post(
-                f"{API_BASE_URL}/assistant",
-                json={"message": message, "context": self._get_context()}
+            response = await self.client.post(
+                "/assistant",
+                json={"message": message, "context": self._get_context(conversation_history)}
             )
             
             if response.status_code == 200:
@@ -32,92 +45,97 @@ class DiagramAssistant:
                 assistant_response = data["response"]
                 
                 # Add to conversation history
-                self.conversation_history.append(("user", message))
-                self.conversation_history.append(("assistant", assistant_response))
+                conversation_history = conversation_history + [("user", message), ("assistant", assistant_response)]
                 
                 # If a diagram was generated, return both text and image
                 if data.get("action") == "diagram_generated" and data.get("image_data"):
                     image = self._decode_image(data["image_data"])
-                    return assistant_response, image
+                    return assistant_response, image, conversation_history
                 else:
-                    return assistant_response, None
+                    return assistant_response, None, conversation_history
             else:
                 error_msg = f"API Error: {response.status_code} - {response.text}"
                 logger.error(error_msg)
-                return error_msg, None
+                return error_msg, None, conversation_history
                 
-        except requests.exceptions.ConnectionError:
-            return "❌ Cannot connect to the API server. Make sure it's running on http://localhost:8000", None
+        except httpx.ConnectError:
+            return CONNECTION_ERROR, None, conversation_history
         except Exception as e:
             logger.error(f"Error: {e}")
-            return f"❌ Error: {str(e)}", None
+            return f"❌ Error: {str(e)}", None, conversation_history
     
-    def generate_diagram_direct(self, description):
-        """Direct diagram generation"""
+    async def generate_diagram_stream(self, description):
+        """Direct diagram generation, yielding (image, status) as progress arrives"""
         try:
-            response = requests.post(
-                f"{API_BASE_URL}/generate-diagram",
+            async with self.client.stream(
+                "POST",
+                "/generate-diagram/stream",
                 json={"description": description}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                image = self._decode_image(data["image_data"])
-                return image, data["message"]
-            else:
-                error_msg = f"API Error: {response.status_code} - {response.text}"
-                logger.error(error_msg)
-                return None, error_msg
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    error_msg = f"API Error: {response.status_code} - {body.decode(errors='replace')}"
+                    logger.error(error_msg)
+                    yield None, error_msg
+                    return
                 
-        except requests.exceptions.ConnectionError:
-            return None, "❌ Cannot connect to the API server. Make sure it's running on http://localhost:8000"
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event["event"] == "status":
+                        yield None, f"⏳ {event['message']}"
+                    elif event["event"] == "spec":
+                        spec = event["specification"]
+                        yield None, f"⏳ Specification ready: {len(spec['nodes'])} components, {len(spec['edges'])} connections"
+                    elif event["event"] == "image":
+                        yield self._decode_image(event["image_data"]), event["message"]
+                    elif event["event"] == "error":
+                        yield None, f"❌ {event['detail']}"
+                
+        except httpx.ConnectError:
+            yield None, CONNECTION_ERROR
         except Exception as e:
             logger.error(f"Error: {e}")
-            return None, f"❌ Error: {str(e)}"
+            yield None, f"❌ Error: {str(e)}"
     
     def _decode_image(self, image_data):
         """Decode base64 image data to PIL Image"""
         image_bytes = base64.b64decode(image_data)
         return Image.open(io.BytesIO(image_bytes))
     
-    def _get_context(self):
+    def _get_context(self, conversation_history):
         """Get conversation context for the assistant"""
-        if not self.conversation_history:
+        if not conversation_history:
             return None
         
         # Return last 3 exchanges for context
-        recent_history = self.conversation_history[-6:]  # 3 exchanges = 6 messages
+        recent_history = conversation_history[-6:]  # 3 exchanges = 6 messages
         context_parts = []
         for role, msg in recent_history:
             context_parts.append(f"{role}: {msg}")
         return "\n".join(context_parts)
-    
-    def clear_history(self):
-        """Clear conversation history"""
-        self.conversation_history = []
-        return None, None
 
 # Initialize assistant
 assistant = DiagramAssistant()
 
-def chat_interface(message, history):
-    """Gradio chat interface wrapper"""
-    response, image = assistant.chat_with_assistant(message, history)
+async def chat_interface(message, history, conversation_history):
+    """Gradio chat interface wrapper, streaming a placeholder while the API works"""
+    history = history + [[message, "⏳ Thinking..."]]
+    yield history, "", None, conversation_history
     
-    # Update chat history
-    history.append([message, response])
-    
-    return history, "", image
+    response, image, conversation_history = await assistant.chat_with_assistant(message, conversation_history)
+    history[-1] = [message, response]
+    yield history, "", image, conversation_history
 
-def direct_diagram_interface(description):
+async def direct_diagram_interface(description):
     """Direct diagram generation interface"""
-    image, message = assistant.generate_diagram_direct(description)
-    return image, message
+    async for image, message in assistant.generate_diagram_stream(description):
+        yield image, message
 
 def clear_conversation():
     """Clear conversation and return empty state"""
-    assistant.clear_history()
-    return [], None
+    return [], None, []
 
 # Create Gradio interface
 with gr.Blocks(title="Diagram API Assistant", theme=gr.themes.Soft()) as demo:
@@ -156,15 +174,15 @@ with gr.Blocks(title="Diagram API Assistant", theme=gr.themes.Soft()) as demo:
                         height=400
                     )
             
-            # Chat functionality
-            def respond(message, history):
-                response, image = assistant.chat_with_assistant(message, history)
-                history.append([message, response])
-                return history, "", image
+            # Per-session conversation history for the assistant context
+            conversation_state = gr.State([])
             
-            msg.submit(respond, [msg, chatbot], [chatbot, msg, diagram_output])
-            send_btn.click(respond, [msg, chatbot], [chatbot, msg, diagram_output])
-            clear_btn.click(clear_conversation, [], [chatbot, diagram_output])
+            # Chat functionality
+            chat_inputs = [msg, chatbot, conversation_state]
+            chat_outputs = [chatbot, msg, diagram_output, conversation_state]
+            msg.submit(chat_interface, chat_inputs, chat_outputs)
+            send_btn.click(chat_interface, chat_inputs, chat_outputs)
+            clear_btn.click(clear_conversation, [], [chatbot, diagram_output, conversation_state])
         
         # Direct Diagram Tab  
         with gr.TabItem("🎨 Direct Diagram Generation"):
@@ -209,10 +227,10 @@ with gr.Blocks(title="Diagram API Assistant", theme=gr.themes.Soft()) as demo:
 def main():
     """Launch the Gradio interface"""
     print("🚀 Starting Diagram Assistant Web Interface...")
-    print("🔗 Make sure the API server is running on http://localhost:8000")
+    print(f"🔗 Make sure the API server is running on {API_BASE_URL}")
     print("📱 Web interface will be available at: http://localhost:7860")
     
-    demo.launch(
+    demo.queue(default_concurrency_limit=CONCURRENCY_LIMIT).launch(
         server_name="0.0.0.0",
         server_port=7860,
         share=False,
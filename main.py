@@ -1,8 +1,15 @@
+import os
+import asyncio
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.core.config import get_settings
 from app.core.logging import setup_logging
+from app.core.server import serve_prefork
 from app.api.endpoints import router
+from app.services.render_sandbox import get_render_sandbox
+from app.services.render_queue import start_broker_process
+from app.services.warmup import run_warmup, mark_ready
 
 # Setup logging
 logger = setup_logging()
@@ -10,11 +17,24 @@ logger = setup_logging()
 # Get settings
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up in the background; /ready reports not ready until it finishes"""
+    if settings.warmup_enabled:
+        warmup_task = asyncio.create_task(asyncio.to_thread(run_warmup))
+    else:
+        mark_ready()
+    yield
+    if settings.warmup_enabled and not warmup_task.done():
+        warmup_task.cancel()
+    get_render_sandbox().shutdown()
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    description="An async Python API service for generating system architecture diagrams using LLM agents"
+    description="An async Python API service for generating system architecture diagrams using LLM agents",
+    lifespan=lifespan
 )
 
 # Include API routes at root level for tests compatibility
@@ -35,12 +55,31 @@ def main():
     logger.info(f"Debug mode: {settings.debug}")
     logger.info(f"Server: {settings.host}:{settings.port}")
     
-    uvicorn.run(
-        "main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=settings.debug
-    )
+    # One broker process shared by every API worker; it runs in its own process so the
+    # forked workers inherit none of its threads or sockets
+    embedded_broker = settings.render_backend == "remote" and settings.render_broker_embedded
+    prefork = not settings.debug and settings.workers > 1 and hasattr(os, "fork")
+    if embedded_broker and not prefork:
+        start_broker_process()
+    
+    if prefork:
+        # The pre-fork supervisor starts the broker itself and restarts it if it dies
+        serve_prefork(app, settings.host, settings.port, settings.workers,
+                      start_broker_process if embedded_broker else None)
+    elif settings.debug or settings.workers <= 1:
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=settings.port,
+            reload=settings.debug
+        )
+    else:
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=settings.port,
+            workers=settings.workers
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Render worker: pulls diagram render jobs from the render broker and sends back images.
+
+Run several on one machine with --workers, or one per host pointed at RENDER_BROKER_HOST.
+With --broker the broker runs next to the workers instead of next to the API (set
+RENDER_BROKER_EMBEDDED=false on the API side).
+"""
+import os
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+import multiprocessing
+from app.core.config import get_settings
+from app.core.cancellation import CancelToken, use_token
+from app.core.logging import setup_logging
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.diagram_service import DiagramService
+from app.services.render_queue import error_kind, recv_message, send_message, start_broker_process
+from app.services.warmup import SAMPLE_SPEC
+
+logger = logging.getLogger(__name__)
+
+# Pause before reconnecting after the broker goes away
+RECONNECT_SECONDS = 1.0
+
+def render_job(service: DiagramService, job: dict):
+    """Render one job and build the result message for it"""
+    reply = {"type": "result", "job_id": job["job_id"]}
+    try:
+        image = service.render_local(
+            DiagramSpec.model_validate_json(job["spec"]),
+            RenderOptions.model_validate_json(job["options"])
+        )
+    except Exception as e:
+        if error_kind(e) == "cancelled":
+            logger.info(f"Render job {job['job_id']} cancelled by the broker")
+        else:
+            logger.warning(f"Render job {job['job_id']} failed: {e}")
+        return {**reply, "status": "error", "kind": error_kind(e), "detail": str(e)}, b""
+    return {**reply, "status": "ok"}, image
+
+def serve_connection(sock: socket.socket, worker_id: str, service: DiagramService) -> None:
+    settings = get_settings()
+    send_lock = threading.Lock()
+    stop = threading.Event()
+    running = {}
+
+    def heartbeat():
+        # Keeps flowing while a render is running, so the broker can tell slow from lost
+        while not stop.wait(settings.render_heartbeat_seconds):
+            try:
+                with send_lock:
+                    send_message(sock, {"type": "heartbeat"})
+            except OSError:
+                return
+
+    def render(job: dict, token: CancelToken):
+        # The sandbox kills the Graphviz process once the token is cancelled
+        with use_token(token):
+            header, body = render_job(service, job)
+        running.pop(job["job_id"], None)
+        try:
+            with send_lock:
+                send_message(sock, header, body)
+        except OSError:
+            pass
+
+    send_message(sock, {"type": "hello", "role": "worker", "worker_id": worker_id, "pid": os.getpid(),
+                        "token": settings.render_broker_token})
+    threading.Thread(target=heartbeat, name="render-heartbeat", daemon=True).start()
+    try:
+        # Renders run in a thread so this loop can still receive cancel messages
+        while True:
+            message, _ = recv_message(sock)
+            if message["type"] == "job":
+                token = running[message["job_id"]] = CancelToken()
+                threading.Thread(target=render, args=(message, token), name="render-job", daemon=True).start()
+            elif message["type"] == "cancel" and message["job_id"] in running:
+                running[message["job_id"]].cancel()
+    finally:
+        stop.set()
+        # A job in flight is requeued elsewhere by the broker
+        for token in list(running.values()):
+            token.cancel()
+
+def run_worker() -> None:
+    """Worker process main loop: connect, serve jobs, reconnect when the broker goes away"""
+    # Restarted workers are forked after the supervisor installed its own handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    settings = get_settings()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    service = DiagramService()
+    try:
+        # Prime Graphviz, fonts and scaled icons before taking real jobs
+        service.render_local(SAMPLE_SPEC, RenderOptions())
+    except Exception as e:
+        logger.warning(f"Render worker {worker_id} warm-up render failed: {e}")
+    while True:
+        try:
+            sock = socket.create_connection((settings.render_broker_host, settings.render_broker_port))
+        except OSError as e:
+            logger.warning(f"Render broker unreachable at {settings.render_broker_host}:{settings.render_broker_port}: {e}")
+            time.sleep(RECONNECT_SECONDS)
+            continue
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logger.info(f"Render worker {worker_id} connected to broker")
+        try:
+            serve_connection(sock, worker_id, service)
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Render worker {worker_id} lost the broker: {e}")
+        finally:
+            sock.close()
+        time.sleep(RECONNECT_SECONDS)
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagram API render worker")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to run on this machine")
+    parser.add_argument("--broker", action="store_true", help="also run the render broker in this process")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.broker:
+        start_broker_process()
+
+    processes = {}
+    stopping = False
+
+    def spawn():
+        process = multiprocessing.Process(target=run_worker, name="render-worker")
+        process.start()
+        processes[process.pid] = process
+        logger.info(f"Started render worker {process.pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        spawn()
+    while processes:
+        for pid, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del processes[pid]
+            if not stopping:
+                logger.warning(f"Render worker {pid} exited with code {process.exitcode}, restarting")
+                spawn()
+        time.sleep(0.5)
+    logger.info("All render workers stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Client disconnects cancelling the request pipeline, down to a pending LLM call (no server or API key needed)
+"""
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fastapi import FastAPI
+from openai import OpenAI
+from app.api.endpoints import router, get_llm_service
+from app.core.cancellation import CancelToken, RequestCancelled, raise_if_cancelled, use_token
+from app.core.config import get_settings
+from app.services import llm_service as llm_module
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm_service import LLMService
+from app.services.model_router import route_request
+
+class StalledStream(BaseHTTPRequestHandler):
+    """Upstream that accepts a streamed completion, then sends nothing"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["content-length"]))
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.end_headers()
+        self.wfile.flush()
+        time.sleep(10)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stalled_upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StalledStream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+
+def post_then_disconnect(app: FastAPI, path: str, body: dict) -> int:
+    """Send one request straight to the ASGI app; the client disconnects right after sending the body"""
+    messages = [
+        {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False},
+        {"type": "http.disconnect"}
+    ]
+    sent = []
+
+    async def receive():
+        if len(messages) > 1:
+            return messages.pop(0)
+        # Stays disconnected however often it is polled
+        return messages[0]
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json")], "client": ("test", 1), "server": ("test", 80)
+    }
+    asyncio.run(app(scope, receive, send))
+    return next(message["status"] for message in sent if message["type"] == "http.response.start")
+
+def test_disconnect_returns_499_and_cancels_pipeline():
+    started, stopped = threading.Event(), threading.Event()
+
+    class SlowLLM:
+        def generate_diagram_spec(self, description, deadline=None):
+            started.set()
+            while True:
+                try:
+                    raise_if_cancelled("test")
+                except RequestCancelled:
+                    stopped.set()
+                    raise
+                time.sleep(0.01)
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_llm_service] = SlowLLM
+    assert post_then_disconnect(app, "/generate-diagram", {"description": "web server"}) == 499
+    assert started.is_set()
+    # The threadpool work is abandoned by the endpoint but stops at its next check
+    assert stopped.wait(5)
+
+def test_llm_call_cancelled_while_waiting_for_first_chunk(stalled_upstream, monkeypatch):
+    monkeypatch.setattr(get_settings(), "openrouter_api_key", "test-key")
+    monkeypatch.setattr(llm_module, "llm_circuit", CircuitBreaker("test", 1, 60))
+    service = LLMService()
+    service.client = OpenAI(api_key="test-key", base_url=stalled_upstream)
+    token, errors = CancelToken(), []
+
+    def call():
+        with use_token(token):
+            try:
+                service._complete("test", route_request("hi"), [{"role": "user", "content": "hi"}], 0, 10, 30)
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    time.sleep(0.5)
+    cancelled = time.monotonic()
+    token.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert time.monotonic() - cancelled < 2
+    assert len(errors) == 1 and isinstance(errors[0], RequestCancelled)
+    # A disconnect is not an upstream failure
+    assert not llm_module.llm_circuit.is_open
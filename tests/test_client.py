@@ -0,0 +1,60 @@
+"""
+Retry behaviour of the Python client SDK (no server needed)
+"""
+import os
+import threading
+import httpx
+import pytest
+from diagram_client.cache import ImageCache
+from diagram_client.client import DiagramClient
+
+def make_client(error: Exception) -> tuple:
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        raise error
+
+    client = DiagramClient("http://testserver", max_retries=2, backoff=0.001)
+    client._http = httpx.Client(base_url="http://testserver", transport=httpx.MockTransport(handler))
+    return client, calls
+
+def test_generate_not_resent_after_dropped_connection():
+    client, calls = make_client(httpx.ReadError("connection reset"))
+    with pytest.raises(httpx.ReadError):
+        client.generate("web app")
+    assert calls == ["/generate-diagram"]
+
+def test_generate_retried_when_never_connected():
+    client, calls = make_client(httpx.ConnectError("connection refused"))
+    with pytest.raises(httpx.ConnectError):
+        client.generate("web app")
+    assert calls == ["/generate-diagram"] * 3
+
+def test_render_and_get_retried_after_dropped_connection():
+    client, calls = make_client(httpx.ReadError("connection reset"))
+    for call in (lambda: client.render({"diagram": {"name": "x"}, "nodes": []}), client.tools):
+        calls.clear()
+        with pytest.raises(httpx.ReadError):
+            call()
+        assert len(calls) == 3
+
+def test_image_cache_concurrent_writes_of_one_key(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    errors = []
+
+    def write(i):
+        try:
+            for _ in range(50):
+                cache.set("same", b"image %d" % i)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.get("same").startswith(b"image ")
+    assert os.listdir(tmp_path) == ["same.img"]
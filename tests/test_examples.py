@@ -129,6 +129,60 @@ def test_available_tools():
         print(f"❌ Tools endpoint failed: {response.status_code}")
         return False
 
+def test_render_overview():
+    """Test level-of-detail overview and cluster drill-down rendering"""
+    print("\nTesting Level-of-Detail Rendering...")
+    
+    spec = {
+        "diagram": {"name": "Large Platform", "filename": "diagram", "show": False},
+        "nodes": [
+            {"id": f"svc{i}", "type": "aws.compute.EC2", "label": f"Service {i}"}
+            for i in range(20)
+        ],
+        "clusters": [
+            {"id": "tier_a", "name": "Tier A", "nodes": [f"svc{i}" for i in range(10)]},
+            {"id": "tier_b", "name": "Tier B", "nodes": [f"svc{i}" for i in range(10, 20)]}
+        ],
+        "edges": [{"from": f"svc{i}", "to": f"svc{i + 10}"} for i in range(10)]
+    }
+    
+    overview = requests.post(
+        f"{BASE_URL}/render-diagram",
+        json={"spec": spec, "options": {"detail": "overview"}}
+    )
+    drill_down = requests.post(
+        f"{BASE_URL}/render-diagram",
+        json={"spec": spec, "options": {"focus_cluster": "tier_a"}}
+    )
+    
+    if overview.status_code == 200 and drill_down.status_code == 200:
+        save_image(overview.json()["image_data"], "lod_overview.png")
+        save_image(drill_down.json()["image_data"], "lod_tier_a.png")
+        print("✅ Level-of-detail rendering passed")
+        return True
+    else:
+        print(f"❌ Level-of-detail rendering failed: {overview.status_code} / {drill_down.status_code}")
+        return False
+
+def test_render_limits():
+    """Test that oversized specs are rejected before rendering"""
+    print("\nTesting Render Input Limits...")
+    
+    spec = {
+        "diagram": {"name": "Too Long", "filename": "diagram", "show": False},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "x" * 10000}],
+        "edges": []
+    }
+    
+    response = requests.post(f"{BASE_URL}/render-diagram", json={"spec": spec})
+    
+    if response.status_code == 413:
+        print("✅ Render input limits passed")
+        return True
+    else:
+        print(f"❌ Render input limits failed: expected 413, got {response.status_code}")
+        return False
+
 if __name__ == "__main__":
     print("Running Diagram API Tests")
     print("=" * 50)
@@ -138,6 +192,8 @@ if __name__ == "__main__":
     # Run tests
     results = []
     results.append(test_available_tools())
+    results.append(test_render_overview())
+    results.append(test_render_limits())
     results.append(test_simple_case())
     results.append(test_example_1())
     results.append(test_example_2())
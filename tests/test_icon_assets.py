@@ -0,0 +1,74 @@
+"""
+Icons pre-scaled per DPI and their use in rendered diagrams (no Graphviz needed)
+"""
+import os
+import pytest
+from PIL import Image
+from diagrams.aws.compute import EC2
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services import icon_assets
+from app.services.diagram_service import DiagramService
+from app.services.icon_assets import ICON_INCHES, icon_source, prepare_icons, scaled_icon
+from app.services.layout_cache import PositionedDiagram
+
+@pytest.fixture
+def icon_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "icon_cache_dir", str(tmp_path))
+    monkeypatch.setattr(icon_assets, "_scaled", {})
+    return tmp_path
+
+def test_icon_scaled_to_node_size_per_dpi(icon_dir):
+    with Image.open(icon_source(EC2)) as source:
+        source_size = max(source.size)
+    for dpi in (72, 96, 150, 600):
+        path = scaled_icon(EC2, dpi)
+        assert path.startswith(os.path.join(str(icon_dir), str(dpi)))
+        with Image.open(path) as image:
+            # Shrunk to the node box, never enlarged
+            assert max(image.size) == min(source_size, round(ICON_INCHES * dpi))
+            assert image.mode == "RGBA"
+
+def test_scaled_icons_are_reused(icon_dir, monkeypatch):
+    path = scaled_icon(EC2, 96)
+    # Same process: served from memory without touching the source
+    monkeypatch.setattr(icon_assets, "icon_source", lambda node_class: pytest.fail("icon rebuilt"))
+    assert scaled_icon(EC2, 96) == path
+    # Another worker: finds the file already built
+    monkeypatch.setattr(icon_assets, "_scaled", {})
+    monkeypatch.setattr(icon_assets, "icon_source", icon_source)
+    modified = os.path.getmtime(path)
+    assert scaled_icon(EC2, 96) == path
+    assert os.path.getmtime(path) == modified
+
+def test_prepare_icons_builds_each_dpi(icon_dir):
+    paths = prepare_icons(["aws.compute.EC2", "aws.database.RDS"], [96, 150])
+    assert len(paths) == 4
+    assert all(os.path.exists(path) for path in paths)
+
+def render_dot_source(monkeypatch, options: RenderOptions) -> str:
+    """Run the render pipeline, returning the Graphviz source instead of running Graphviz on it"""
+    def render(self):
+        self.dot.save()
+        with open(self.filename) as source, open(f"{self.filename}.{self.outformat}", "w") as image:
+            image.write(source.read())
+
+    monkeypatch.setattr(PositionedDiagram, "render", render)
+    monkeypatch.setattr(get_settings(), "layout_cache_enabled", False)
+    spec = DiagramSpec.model_validate({
+        "diagram": {"name": "Icons"},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "Web"}]
+    })
+    return DiagramService()._render_png(spec, options).decode()
+
+def test_render_uses_scaled_icon_for_its_dpi(icon_dir, monkeypatch):
+    monkeypatch.setattr(get_settings(), "icon_cache_enabled", True)
+    assert scaled_icon(EC2, 150) in render_dot_source(monkeypatch, RenderOptions(dpi=150))
+    assert scaled_icon(EC2, icon_assets.DEFAULT_DPI) in render_dot_source(monkeypatch, RenderOptions())
+
+def test_render_uses_bundled_icon_when_cache_disabled(icon_dir, monkeypatch):
+    monkeypatch.setattr(get_settings(), "icon_cache_enabled", False)
+    source = render_dot_source(monkeypatch, RenderOptions(dpi=150))
+    assert str(icon_dir) not in source
+    assert "ec2.png" in source
+    assert not os.listdir(icon_dir)
@@ -0,0 +1,97 @@
+"""
+Image variants: resizing, WebP, optimization, thumbnails and their cache entries (no Graphviz needed)
+"""
+import io
+import uuid
+from PIL import Image
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services import diagram_service as diagram_module
+from app.services.cache import spec_hash
+from app.services.diagram_service import DiagramService
+from app.services.image_output import convert_image, needs_conversion
+
+def make_png(width: int = 800, height: int = 400) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(output, format="PNG")
+    return output.getvalue()
+
+def unique_spec() -> DiagramSpec:
+    return DiagramSpec.model_validate({
+        "diagram": {"name": f"Variants {uuid.uuid4()}"},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "Web"}]
+    })
+
+def opened(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+def test_needs_conversion():
+    assert not needs_conversion(RenderOptions())
+    # Graphviz-side and delivery options leave the PNG as rendered
+    assert not needs_conversion(RenderOptions(dpi=150, layout="dot", thumbnail=True, delivery="url"))
+    assert needs_conversion(RenderOptions(width=200))
+    assert needs_conversion(RenderOptions(format="webp"))
+    assert needs_conversion(RenderOptions(optimize=True))
+
+def test_plain_png_passes_through_unchanged():
+    png = make_png()
+    assert convert_image(png, RenderOptions()) is png
+
+def test_width_downscales_keeping_aspect_ratio():
+    image = opened(convert_image(make_png(800, 400), RenderOptions(width=200)))
+    assert image.format == "PNG"
+    assert image.size == (200, 100)
+    # Never upscaled
+    assert opened(convert_image(make_png(100, 50), RenderOptions(width=200))).size == (100, 50)
+
+def test_webp_and_optimized_png():
+    png = make_png()
+    webp = opened(convert_image(png, RenderOptions(format="webp")))
+    assert webp.format == "WEBP"
+    assert webp.size == (800, 400)
+    optimized = convert_image(png, RenderOptions(optimize=True))
+    assert opened(optimized).format == "PNG"
+    assert len(optimized) <= len(png)
+
+def test_variants_share_one_graphviz_render(monkeypatch):
+    calls = []
+
+    def run_graphviz(self, spec, options):
+        calls.append(options)
+        return make_png()
+
+    monkeypatch.setattr(DiagramService, "_run_graphviz", run_graphviz)
+    service, spec = DiagramService(), unique_spec()
+    options = RenderOptions(width=200, format="webp")
+
+    assert service.render_image(spec, RenderOptions()) == make_png()
+    image = service.render_image(spec, options)
+    assert opened(image).format == "WEBP"
+    assert opened(image).size == (200, 100)
+    assert len(calls) == 1
+
+    # Delivery and thumbnail flags do not change the bytes, so they share the variant entry
+    variant_key = f"variant:{spec_hash(spec)}:{options.model_dump_json(exclude={'thumbnail', 'delivery'})}"
+    assert diagram_module.render_cache.get(variant_key) == image
+    monkeypatch.setattr(diagram_module, "convert_image", lambda *args: b"converted again")
+    assert service.render_image(spec, options.model_copy(update={"delivery": "url", "thumbnail": True})) == image
+    assert len(calls) == 1
+
+def test_thumbnail_reuses_full_size_render(monkeypatch):
+    calls = []
+
+    def run_graphviz(self, spec, options):
+        calls.append(options)
+        return make_png()
+
+    monkeypatch.setattr(DiagramService, "_run_graphviz", run_graphviz)
+    service, spec = DiagramService(), unique_spec()
+    service.render_image(spec, RenderOptions())
+    thumbnail = opened(service.render_thumbnail(spec, RenderOptions()))
+    assert thumbnail.width == min(800, get_settings().thumbnail_width)
+    assert len(calls) == 1
+
+def test_uncached_render_still_converts(monkeypatch):
+    monkeypatch.setattr(DiagramService, "_run_graphviz", lambda self, spec, options: make_png())
+    image = DiagramService().render_image(unique_spec(), RenderOptions(format="webp"), use_cache=False)
+    assert opened(image).format == "WEBP"
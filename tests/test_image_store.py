@@ -0,0 +1,41 @@
+"""
+Image store writes and conditional GETs of stored images (no server needed)
+"""
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import endpoints
+from app.api.endpoints import etag_matches, router
+from app.services.image_store import ImageStore
+
+def test_put_rewrites_an_image_evicted_by_another_worker(tmp_path):
+    store = ImageStore(str(tmp_path), 1024 * 1024)
+    digest = store.put(b"png bytes", "png")
+    os.remove(store.get_path(digest))
+    assert store.put(b"png bytes", "png") == digest
+    with open(store.get_path(digest), "rb") as f:
+        assert f.read() == b"png bytes"
+
+def test_etag_matching_follows_rfc_9110():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"old", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abcd"', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+
+def test_stored_image_conditional_get(tmp_path, monkeypatch):
+    store = ImageStore(str(tmp_path), 1024 * 1024)
+    monkeypatch.setattr(endpoints, "get_image_store", lambda: store)
+    digest = store.put(b"\x89PNG stored", "png")
+    client = TestClient(FastAPI(routes=router.routes))
+
+    response = client.get(f"/images/{digest}")
+    assert response.status_code == 200
+    assert response.content == b"\x89PNG stored"
+    etag = response.headers["etag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        assert client.get(f"/images/{digest}", headers={"If-None-Match": header}).status_code == 304
+    assert client.get(f"/images/{digest}", headers={"If-None-Match": '"other"'}).status_code == 200
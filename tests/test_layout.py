@@ -0,0 +1,46 @@
+"""
+Layout engine and graph attribute selection by spec size and density (no Graphviz needed)
+"""
+import pytest
+from pydantic import ValidationError
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.layout import select_layout
+
+def chain_spec(nodes: int, edges_per_node: int = 1) -> DiagramSpec:
+    ids = [f"n{i}" for i in range(nodes)]
+    return DiagramSpec.model_validate({
+        "diagram": {"name": "Layout"},
+        "nodes": [{"id": node_id, "type": "aws.compute.EC2", "label": node_id} for node_id in ids],
+        "edges": [{"from": ids[i], "to": ids[(i + step) % nodes]}
+                  for i in range(nodes) for step in range(1, edges_per_node + 1)]
+    })
+
+def test_engine_follows_node_count_thresholds():
+    settings = get_settings()
+    assert select_layout(chain_spec(settings.layout_neato_nodes - 1))["engine"] == "dot"
+    assert select_layout(chain_spec(settings.layout_neato_nodes))["engine"] == "neato"
+    assert select_layout(chain_spec(settings.layout_sfdp_nodes - 1))["engine"] == "neato"
+    assert select_layout(chain_spec(settings.layout_sfdp_nodes))["engine"] == "sfdp"
+
+def test_dot_is_bounded_for_large_or_dense_graphs():
+    settings = get_settings()
+    small = select_layout(chain_spec(settings.layout_bounded_dot_nodes - 1))["graph_attr"]
+    assert small == {}
+    large = select_layout(chain_spec(settings.layout_bounded_dot_nodes))["graph_attr"]
+    assert large == {"nslimit": settings.layout_nslimit, "nslimit1": settings.layout_nslimit,
+                     "mclimit": settings.layout_mclimit}
+    dense = select_layout(chain_spec(10, int(settings.layout_dense_edge_ratio)))["graph_attr"]
+    assert dense["concentrate"] == "true"
+    assert dense["splines"] == "polyline"
+    assert "nslimit" in dense
+
+def test_explicit_engine_overrides_thresholds():
+    layout = select_layout(chain_spec(3), "sfdp")
+    assert layout["engine"] == "sfdp"
+    assert layout["graph_attr"]["layout"] == "sfdp"
+    assert layout["graph_attr"]["overlap"] == "prism"
+
+def test_unknown_engine_rejected_by_render_options():
+    with pytest.raises(ValidationError):
+        RenderOptions(layout="circo")
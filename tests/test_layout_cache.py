@@ -0,0 +1,70 @@
+"""
+Layout cache keys and -Tjson position mapping (no Graphviz needed)
+"""
+import json
+from app.models.schemas import DiagramSpec
+from app.services.layout_cache import extract_positions, topology_hash
+
+GRAPH_ATTR = {"rankdir": "LR"}
+
+def make_spec(name: str = "Web", **changes) -> DiagramSpec:
+    spec = {
+        "diagram": {"name": name},
+        "nodes": [
+            {"id": "lb", "type": "aws.network.ALB", "label": "LB"},
+            {"id": "web", "type": "aws.compute.EC2", "label": "Web"},
+            {"id": "db", "type": "aws.database.RDS", "label": "Database"}
+        ],
+        "clusters": [{"id": "app", "name": "App", "nodes": ["web"]}],
+        "edges": [{"from": "lb", "to": "web"}, {"from": "web", "to": "db", "label": "SQL"}]
+    }
+    for path, value in changes.items():
+        section, index, field = path.split("__")
+        spec[section][int(index)][field] = value
+    return DiagramSpec.model_validate(spec)
+
+def test_label_only_edit_reuses_layout():
+    base = topology_hash(make_spec(), GRAPH_ATTR)
+    assert topology_hash(make_spec(nodes__1__label="App", nodes__2__type="aws.database.Aurora"), GRAPH_ATTR) == base
+    assert topology_hash(make_spec(edges__1__label="TCP"), GRAPH_ATTR) == base
+
+def test_topology_or_label_size_edit_recomputes_layout():
+    base = topology_hash(make_spec(), GRAPH_ATTR)
+    assert topology_hash(make_spec(edges__0__to="db"), GRAPH_ATTR) != base
+    assert topology_hash(make_spec(nodes__2__label="Primary database"), GRAPH_ATTR) != base
+    assert topology_hash(make_spec(nodes__1__label="Web\nserver"), GRAPH_ATTR) != base
+    assert topology_hash(make_spec(edges__1__label="PostgreSQL wire protocol"), GRAPH_ATTR) != base
+    assert topology_hash(make_spec(clusters__0__name="Application tier"), GRAPH_ATTR) != base
+    assert topology_hash(make_spec(name="Shop"), GRAPH_ATTR) != base
+    assert topology_hash(make_spec(), {"rankdir": "TB"}) != base
+
+def layout(objects: list) -> bytes:
+    return json.dumps({
+        "bb": "0,0,300,100",
+        "_subgraph_cnt": 1,
+        "objects": objects,
+        "edges": [{"tail": 1, "head": 2, "pos": "e,1,1"}, {"tail": 2, "head": 3, "pos": "e,2,2"}]
+    }).encode()
+
+def test_extract_positions_maps_gvids_onto_spec():
+    objects = [
+        {"_gvid": 0, "name": "cluster_App", "bb": "10,10,90,90"},
+        {"_gvid": 1, "name": "lb", "pos": "5,50"},
+        {"_gvid": 2, "name": "web", "pos": "50,50"},
+        {"_gvid": 3, "name": "db", "pos": "95,50"}
+    ]
+    positions = extract_positions(layout(objects), {"cluster_App": "app"}, {"lb", "web", "db"})
+    assert positions["clusters"]["app"]["bb"] == "10,10,90,90"
+    assert positions["edges"]["lb->web"]["pos"] == "e,1,1"
+    assert positions["edges"]["web->db"]["pos"] == "e,2,2"
+
+def test_extract_positions_rejects_inconsistent_layout():
+    objects = [
+        {"_gvid": 0, "name": "cluster_App", "bb": "10,10,90,90"},
+        {"_gvid": 2, "name": "lb", "pos": "5,50"},
+        {"_gvid": 1, "name": "web", "pos": "50,50"},
+        {"_gvid": 3, "name": "db", "pos": "95,50"}
+    ]
+    assert extract_positions(layout(objects), {"cluster_App": "app"}, {"lb", "web", "db"}) is None
+    objects[1]["_gvid"], objects[2]["_gvid"] = 1, 2
+    assert extract_positions(layout(objects), {"cluster_App": "app"}, {"lb", "web", "db", "cache"}) is None
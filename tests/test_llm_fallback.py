@@ -0,0 +1,115 @@
+"""
+Circuit breaker, request deadline and rule-based fallback of the LLM service (no server or API key needed)
+"""
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.endpoints import router, get_llm_service
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services import llm_service as llm_module
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm_service import LLMService
+from app.services.rule_based_generator import generate_rule_based_spec
+
+DIAGRAM_MESSAGE = "Web servers behind a load balancer, then a redis cache"
+
+@pytest.fixture
+def service(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "openrouter_api_key", "test-key")
+    # Force every description past the fast path so the fallback branches are what decides
+    monkeypatch.setattr(settings, "rule_fast_path_enabled", False)
+    monkeypatch.setattr(llm_module, "llm_circuit", CircuitBreaker("test", 2, 60))
+    return LLMService()
+
+def fail_if_called(*args, **kwargs):
+    raise AssertionError("LLM must not be called")
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker("test", 2, 0.05)
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    time.sleep(0.06)
+    # Half-open: one trial call goes through, a single failure re-opens
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    breaker.record_success()
+    assert not breaker.is_open
+
+def test_near_deadline_skips_llm(service, monkeypatch):
+    monkeypatch.setattr(LLMService, "_complete", fail_if_called)
+    before = metrics.get("spec_rule_based_total", {"reason": "deadline"})
+    deadline = time.monotonic() + get_settings().llm_min_budget_seconds / 2
+    spec = service.generate_diagram_spec(f"{DIAGRAM_MESSAGE} (deadline)", deadline)
+    assert {node.id for node in spec.nodes} == {"web_server", "load_balancer", "cache"}
+    assert metrics.get("spec_rule_based_total", {"reason": "deadline"}) == before + 1
+
+def test_open_circuit_skips_llm(service, monkeypatch):
+    monkeypatch.setattr(LLMService, "_complete", fail_if_called)
+    llm_module.llm_circuit.record_failure()
+    llm_module.llm_circuit.record_failure()
+    before = metrics.get("spec_rule_based_total", {"reason": "circuit_open"})
+    spec = service.generate_diagram_spec(f"{DIAGRAM_MESSAGE} (circuit)")
+    assert spec.nodes
+    assert metrics.get("spec_rule_based_total", {"reason": "circuit_open"}) == before + 1
+
+def test_llm_error_falls_back_and_counts_towards_breaker(service, monkeypatch):
+    def broken(self, *args, **kwargs):
+        llm_module.llm_circuit.record_failure()
+        raise RuntimeError("upstream 502")
+
+    monkeypatch.setattr(LLMService, "_complete", broken)
+    before = metrics.get("spec_rule_based_total", {"reason": "llm_error"})
+    for attempt in range(2):
+        assert service.generate_diagram_spec(f"{DIAGRAM_MESSAGE} (error {attempt})").nodes
+    assert metrics.get("spec_rule_based_total", {"reason": "llm_error"}) == before + 2
+    assert llm_module.llm_circuit.is_open
+
+def test_unrecognised_description_still_fails_without_llm(service, monkeypatch):
+    monkeypatch.setattr(LLMService, "_complete", fail_if_called)
+    with pytest.raises(Exception, match="deadline"):
+        service.generate_diagram_spec("something entirely unrelated", time.monotonic())
+
+def test_assistant_falls_back_when_llm_unavailable(service, monkeypatch):
+    monkeypatch.setattr(LLMService, "_complete", fail_if_called)
+    past = time.monotonic()
+    before = metrics.get("assistant_rule_based_total", {"reason": "deadline"})
+    result = service.process_assistant_request(DIAGRAM_MESSAGE, deadline=past)
+    assert result["action"] == "generate_diagram"
+    assert result["description"] == DIAGRAM_MESSAGE
+    assert service.process_assistant_request("hello, how are you?", deadline=past)["action"] == "conversation"
+    assert metrics.get("assistant_rule_based_total", {"reason": "deadline"}) == before + 2
+
+def test_assistant_falls_back_on_llm_error(service, monkeypatch):
+    def broken(self, *args, **kwargs):
+        raise RuntimeError("upstream 502")
+
+    monkeypatch.setattr(LLMService, "_complete", broken)
+    assert service.process_assistant_request(DIAGRAM_MESSAGE)["action"] == "generate_diagram"
+
+def test_deadline_starts_at_request_arrival():
+    seen = {}
+
+    class StubLLM:
+        def process_assistant_request(self, message, context=None, deadline=None):
+            seen["deadline"] = deadline
+            return {"action": "conversation", "response": "hi"}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_llm_service] = StubLLM
+    arrived = time.monotonic()
+    response = TestClient(app).post("/assistant", json={"message": "hi"})
+    assert response.status_code == 200
+    expected = arrived + get_settings().request_deadline_seconds
+    assert expected - 0.5 <= seen["deadline"] <= expected + 0.5
+
+def test_later_cue_continues_from_end_of_flow():
+    spec = generate_rule_based_spec(DIAGRAM_MESSAGE).spec
+    edges = {(edge.from_, edge.to) for edge in spec.edges}
+    assert edges == {("load_balancer", "web_server"), ("web_server", "cache")}
@@ -0,0 +1,120 @@
+"""
+Model tier and max_tokens routing, and the circuit breaker around routed calls (no API key needed)
+"""
+import json
+import uuid
+from types import SimpleNamespace
+import pytest
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services import llm_service as llm_module
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm_service import LLMService
+from app.services.model_router import estimate_complexity, route_request
+
+SMALL = "A web server in front of a database"
+LARGE = ("An e-commerce platform with ten microservices behind an API gateway, a kafka cluster, "
+         "three redis caches, a search cluster, a data warehouse and an ETL pipeline per region")
+SPEC_JSON = json.dumps({
+    "diagram": {"name": "Routed", "filename": "routed", "show": False},
+    "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "Web"}]
+})
+
+class FakeCompletions:
+    """Records each streamed completion request; fails while `error` is set"""
+
+    def __init__(self):
+        self.calls = []
+        self.error = None
+
+    def with_options(self, **options):
+        return SimpleNamespace(chat=SimpleNamespace(completions=self))
+
+    def create(self, **request):
+        self.calls.append(request)
+        if self.error:
+            raise self.error
+        delta = SimpleNamespace(content=SPEC_JSON)
+        chunk = SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason="stop")])
+        return FakeStream([chunk])
+
+class FakeStream(list):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+@pytest.fixture
+def service(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "openrouter_api_key", "test-key")
+    monkeypatch.setattr(settings, "rule_fast_path_enabled", False)
+    monkeypatch.setattr(settings, "model_routing_enabled", True)
+    monkeypatch.setattr(llm_module, "llm_circuit", CircuitBreaker("test", 2, 60))
+    service = LLMService()
+    completions = FakeCompletions()
+    service.client = completions
+    return service, completions
+
+def test_complexity_counts_numbers_clusters_and_compound_names():
+    assert estimate_complexity("three services")["components"] == 3
+    assert estimate_complexity("an RDS database")["components"] == 1
+    assert estimate_complexity("a web tier and a data tier")["clusters"] == 2
+
+def test_tier_and_token_budget(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "model_routing_enabled", True)
+    small, large = route_request(SMALL), route_request(LARGE)
+    assert small["tier"] == "fast"
+    assert small["model"] == settings.openrouter_fast_model
+    assert small["max_tokens"] == settings.spec_min_tokens
+    assert large["tier"] == "strong"
+    assert large["model"] == settings.openrouter_model
+    expected = (settings.spec_base_tokens + settings.spec_tokens_per_component * large["components"]
+                + settings.spec_tokens_per_cluster * large["clusters"])
+    assert large["max_tokens"] == max(settings.spec_min_tokens, min(settings.spec_max_tokens, expected))
+    assert large["max_tokens"] > small["max_tokens"]
+
+def test_token_budget_is_capped():
+    assert route_request("fifty services " * 100)["max_tokens"] == get_settings().spec_max_tokens
+
+def test_routing_disabled_always_uses_strong_model(monkeypatch):
+    monkeypatch.setattr(get_settings(), "model_routing_enabled", False)
+    route = route_request(SMALL)
+    assert route["tier"] == "strong"
+    assert route["model"] == get_settings().openrouter_model
+
+def test_routed_model_and_budget_reach_the_llm(service):
+    service, completions = service
+    for description in (SMALL, LARGE):
+        route = route_request(description)
+        spec = service.generate_diagram_spec(f"{description} {uuid.uuid4()}")
+        assert spec.diagram.name == "Routed"
+        assert completions.calls[-1]["model"] == route["model"]
+        assert completions.calls[-1]["max_tokens"] == route["max_tokens"]
+
+def test_upstream_errors_open_the_breaker(service):
+    service, completions = service
+    completions.error = RuntimeError("upstream 502")
+    for attempt in range(2):
+        # Each failure falls back to the rule-based spec and counts towards the breaker
+        assert service.generate_diagram_spec(f"{SMALL} (error {attempt})").nodes
+    assert llm_module.llm_circuit.is_open
+    assert len(completions.calls) == 2
+
+    before = metrics.get("spec_rule_based_total", {"reason": "circuit_open"})
+    assert service.generate_diagram_spec(f"{SMALL} (open)").nodes
+    assert len(completions.calls) == 2
+    assert metrics.get("spec_rule_based_total", {"reason": "circuit_open"}) == before + 1
+
+def test_success_closes_a_half_open_breaker(service, monkeypatch):
+    service, completions = service
+    monkeypatch.setattr(llm_module, "llm_circuit", CircuitBreaker("test", 2, 0))
+    llm_module.llm_circuit.record_failure()
+    llm_module.llm_circuit.record_failure()
+    service.generate_diagram_spec(f"{SMALL} {uuid.uuid4()}")
+    assert len(completions.calls) == 1
+    llm_module.llm_circuit.record_failure()
+    # The trial call succeeded, so a single new failure does not re-open it
+    assert not llm_module.llm_circuit.is_open
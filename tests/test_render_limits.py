@@ -0,0 +1,44 @@
+"""
+Render input limits, applied to the spec after the level-of-detail reduction (no server needed)
+"""
+import pytest
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.render_sandbox import RenderInputTooLarge, check_input_limits
+
+def clustered_spec(clusters: int, per_cluster: int) -> DiagramSpec:
+    nodes, groups, edges = [], [], []
+    for c in range(clusters):
+        members = [f"n{c}_{i}" for i in range(per_cluster)]
+        nodes += [{"id": node_id, "type": "aws.compute.EC2", "label": node_id} for node_id in members]
+        groups.append({"id": f"c{c}", "name": f"Tier {c}", "nodes": members})
+        if c:
+            edges += [{"from": f"n{c - 1}_{i}", "to": node_id} for i, node_id in enumerate(members)]
+    return DiagramSpec.model_validate({
+        "diagram": {"name": "Large", "filename": "diagram", "show": False},
+        "nodes": nodes,
+        "clusters": groups,
+        "edges": edges
+    })
+
+def test_large_clustered_spec_checked_after_reduction():
+    spec = clustered_spec(30, 100)
+    assert len(spec.nodes) > get_settings().max_spec_nodes
+    check_input_limits(spec, RenderOptions())
+    check_input_limits(spec, RenderOptions(focus_cluster="c3"))
+    with pytest.raises(RenderInputTooLarge, match="after level of detail"):
+        check_input_limits(spec, RenderOptions(detail="full"))
+
+def test_raw_spec_hard_cap(monkeypatch):
+    monkeypatch.setattr(get_settings(), "max_raw_spec_nodes", 1000)
+    with pytest.raises(RenderInputTooLarge, match="limit 1000"):
+        check_input_limits(clustered_spec(30, 100), RenderOptions())
+
+def test_long_label_rejected():
+    spec = DiagramSpec.model_validate({
+        "diagram": {"name": "Too Long", "filename": "diagram", "show": False},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "x" * 10000}],
+        "edges": []
+    })
+    with pytest.raises(RenderInputTooLarge, match="Label too long"):
+        check_input_limits(spec, RenderOptions())
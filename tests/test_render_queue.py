@@ -0,0 +1,144 @@
+"""
+Render broker with several worker processes on one machine (no server or Graphviz needed)
+
+The broker runs in its own process, as main.py starts it; the workers use the real worker
+connection loop with a stand-in renderer.
+"""
+import os
+import time
+import socket
+import threading
+import multiprocessing
+import pytest
+from app.core.cancellation import CancelToken, RequestCancelled, raise_if_cancelled, use_token
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.render_queue import JobQueue, RemoteRenderer, RenderBroker, RenderTimeout, RenderUnavailable, start_broker_process
+
+WORKERS = 3
+TOKEN = "test-token"
+
+class FakeRenderService:
+    """Renders instantly-ish, or until cancelled for a diagram named "slow" """
+
+    def render_local(self, spec: DiagramSpec, options: RenderOptions) -> bytes:
+        deadline = time.monotonic() + (30 if spec.diagram.name == "slow" else 0.2)
+        while time.monotonic() < deadline:
+            raise_if_cancelled("render")
+            time.sleep(0.01)
+        return f"PNG {os.getpid()}".encode()
+
+def fake_worker() -> None:
+    from render_worker import serve_connection
+    settings = get_settings()
+    sock = socket.create_connection((settings.render_broker_host, settings.render_broker_port))
+    serve_connection(sock, f"test-{os.getpid()}", FakeRenderService())
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def spec(name: str) -> DiagramSpec:
+    return DiagramSpec.model_validate({
+        "diagram": {"name": name},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "Web"}]
+    })
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = condition()
+        except RenderUnavailable:
+            result = None
+        if result:
+            return result
+        time.sleep(0.05)
+    raise AssertionError("condition not met in time")
+
+@pytest.fixture(scope="module")
+def cluster():
+    port = free_port()
+    env = {"RENDER_BROKER_PORT": str(port), "RENDER_BROKER_TOKEN": TOKEN, "RENDER_HEARTBEAT_SECONDS": "0.5"}
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    broker = start_broker_process()
+    renderer = RemoteRenderer("127.0.0.1", port, 10, token=TOKEN)
+    wait_for(renderer.status)
+    # Spawned, not forked: each process starts clean, like workers on another host
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=fake_worker, daemon=True) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    try:
+        wait_for(lambda: len(renderer.status()["workers"]) == WORKERS)
+        yield port, renderer
+    finally:
+        for process in workers + [broker]:
+            process.terminate()
+            process.join(5)
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def cancelled_jobs(renderer: RemoteRenderer) -> int:
+    workers = renderer.status()["workers"]
+    return sum(worker["jobs_cancelled"] for worker in workers if worker["current_job"] is None)
+
+def test_jobs_spread_across_workers(cluster):
+    _, renderer = cluster
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(renderer.render(spec(f"d{i}"), RenderOptions())))
+               for i in range(WORKERS * 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(results) == WORKERS * 2
+    assert all(image.startswith(b"PNG ") for image in results)
+    assert len(set(results)) > 1
+    assert sum(worker["jobs_done"] for worker in renderer.status()["workers"]) >= WORKERS * 2
+
+def test_cancelled_request_aborts_render_on_worker(cluster):
+    _, renderer = cluster
+    before = cancelled_jobs(renderer)
+    token, errors = CancelToken(), []
+
+    def request():
+        with use_token(token):
+            try:
+                renderer.render(spec("slow"), RenderOptions())
+            except RequestCancelled as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    wait_for(lambda: any(worker["current_job"] for worker in renderer.status()["workers"]))
+    token.cancel()
+    thread.join(5)
+    assert errors
+    # The worker stops well before the 30s stand-in render would have finished
+    wait_for(lambda: cancelled_jobs(renderer) == before + 1, timeout=5)
+
+def test_timed_out_request_aborts_render_on_worker(cluster):
+    port, renderer = cluster
+    before = cancelled_jobs(renderer)
+    with pytest.raises(RenderTimeout):
+        RemoteRenderer("127.0.0.1", port, 0.5, token=TOKEN).render(spec("slow"), RenderOptions())
+    wait_for(lambda: cancelled_jobs(renderer) == before + 1, timeout=5)
+
+def test_wrong_token_rejected(cluster):
+    port, _ = cluster
+    with pytest.raises(RenderUnavailable):
+        RemoteRenderer("127.0.0.1", port, 5, token="wrong").status()
+
+def test_non_loopback_broker_requires_token():
+    with pytest.raises(RuntimeError, match="RENDER_BROKER_TOKEN"):
+        RenderBroker("0.0.0.0", 0).start()
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
@@ -0,0 +1,46 @@
+"""
+Rule-based spec generation for repeated concepts, lists and confidence (no server needed)
+"""
+from app.services.rule_based_generator import generate_rule_based_spec
+
+def nodes_and_edges(description: str):
+    result = generate_rule_based_spec(description)
+    spec = result.spec
+    return {node.id: node.label for node in spec.nodes}, {(edge.from_, edge.to) for edge in spec.edges}, result.confidence
+
+def test_later_count_adds_nodes():
+    nodes, edges, confidence = nodes_and_edges("microservices architecture with three services and an API gateway")
+    assert nodes == {"service_1": "Service 1", "service_2": "Service 2", "service_3": "Service 3", "api_gateway": "API Gateway"}
+    assert edges == {("api_gateway", f"service_{i}") for i in (1, 2, 3)}
+    assert confidence >= 0.9
+
+def test_distinct_roles_of_one_concept_are_separate_nodes():
+    nodes, edges, confidence = nodes_and_edges("a web server and an app server and a database")
+    assert set(nodes) == {"web_server", "app_server", "database"}
+    assert edges == {("web_server", "app_server"), ("app_server", "database")}
+    assert confidence >= 0.9
+
+def test_cue_connects_every_item_of_a_list():
+    nodes, edges, confidence = nodes_and_edges("A lambda function writes to S3 and DynamoDB")
+    assert set(nodes) == {"function", "storage", "nosql_database"}
+    assert edges == {("function", "storage"), ("function", "nosql_database")}
+    assert confidence >= 0.9
+
+def test_list_stops_at_the_end_of_the_phrase():
+    _, edges, _ = nodes_and_edges(
+        "Microservices: an auth service, a payment service and an order service behind an API gateway, "
+        "each with its own database"
+    )
+    assert not any(source == "database" or target == "database" for source, target in edges)
+
+def test_node_without_edges_lowers_confidence():
+    # The per-service databases are not connected, so the LLM should handle this one
+    result = generate_rule_based_spec(
+        "Microservices: an auth service, a payment service and an order service behind an API gateway, "
+        "each with its own database"
+    )
+    assert result.confidence < 0.9
+
+def test_conflicting_mention_lowers_confidence():
+    result = generate_rule_based_spec("An auth service and a payment service; the two services use an RDS database and the four services scale out")
+    assert result.confidence < 0.9
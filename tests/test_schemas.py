@@ -0,0 +1,30 @@
+"""
+Spec validation of LLM-style output (no server needed)
+"""
+import pytest
+from pydantic import ValidationError
+from app.models.schemas import DiagramSpec, RenderOptions
+
+def test_spec_validation_coerces_llm_output():
+    spec = DiagramSpec.model_validate_json(
+        '{"diagram": {"name": "Web", "show": "false"},'
+        ' "nodes": [{"id": 1, "type": "aws.compute.EC2", "label": "Web"},'
+        ' {"id": 2, "type": "aws.database.RDS", "label": "DB"}],'
+        ' "edges": [{"from": 1, "to": 2}]}'
+    )
+    assert spec.diagram.show is False
+    assert [node.id for node in spec.nodes] == ["1", "2"]
+    assert (spec.edges[0].from_, spec.edges[0].to) == ("1", "2")
+
+def test_render_options_are_strict_and_frozen():
+    options = RenderOptions.model_validate_json('{"dpi": 150, "format": "webp", "optimize": true}')
+    assert (options.dpi, options.format, options.optimize) == (150, "webp", True)
+    with pytest.raises(ValidationError):
+        RenderOptions.model_validate_json('{"dpi": "150"}')
+    with pytest.raises(ValidationError):
+        options.dpi = 300
+
+def test_specs_are_frozen():
+    spec = DiagramSpec.model_validate({"diagram": {"name": "Web"}, "nodes": []})
+    with pytest.raises(ValidationError):
+        spec.diagram.name = "Other"
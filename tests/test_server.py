@@ -0,0 +1,49 @@
+"""
+Pre-fork supervisor restarting the processes it owns (no Graphviz needed)
+"""
+import os
+import time
+import signal
+import socket
+import multiprocessing
+from app.core import server
+
+def short_lived_broker(directory: str) -> None:
+    """Stand-in broker that records its start and dies straight away"""
+    open(os.path.join(directory, f"broker-{os.getpid()}"), "w").close()
+
+async def app(scope, receive, send):
+    pass
+
+def supervise(directory: str, port: int) -> None:
+    server.preload_modules = lambda: None
+    server.RESPAWN_BACKOFF_SECONDS = 0.05
+    context = multiprocessing.get_context("spawn")
+
+    def start_broker():
+        process = context.Process(target=short_lived_broker, args=(directory,), daemon=True)
+        process.start()
+        return process
+
+    server.serve_prefork(app, "127.0.0.1", port, 1, start_broker)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def broker_starts(directory) -> int:
+    return sum(name.startswith("broker-") for name in os.listdir(directory))
+
+def test_dead_broker_is_restarted(tmp_path):
+    supervisor = multiprocessing.get_context("spawn").Process(target=supervise, args=(str(tmp_path), free_port()))
+    supervisor.start()
+    try:
+        deadline = time.monotonic() + 20
+        while broker_starts(tmp_path) < 3 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert broker_starts(tmp_path) >= 3
+    finally:
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(10)
+    assert supervisor.exitcode == 0
@@ -0,0 +1,157 @@
+"""
+Single-flight coalescing of identical concurrent generations and renders (no server needed)
+"""
+import time
+import uuid
+import threading
+from app.core.cancellation import CancelToken, RequestCancelled, raise_if_cancelled, use_token
+from app.core.config import get_settings
+from app.models.schemas import DiagramSpec, RenderOptions
+from app.services.diagram_service import DiagramService
+from app.services.llm_service import LLMService
+from app.services.single_flight import SingleFlight
+
+CALLERS = 4
+
+class Caller(threading.Thread):
+    """One request: its own cancel token, like a pipeline started by run_cancellable"""
+
+    def __init__(self, func):
+        super().__init__(daemon=True)
+        self.func = func
+        self.token = CancelToken()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        with use_token(self.token):
+            try:
+                self.result = self.func()
+            except BaseException as e:
+                self.error = e
+
+def wait_for_waiters(flight: SingleFlight, key: str, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        call = flight._calls.get(key)
+        if call is not None and call.token.waiters == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"expected {count} waiters on {key}")
+
+def slow_work(calls: list, release: threading.Event):
+    def work():
+        calls.append(1)
+        # Checks for cancellation the way LLM streaming and sandbox renders do
+        while not release.wait(0.01):
+            raise_if_cancelled("test")
+        return "result"
+    return work
+
+def start(flight: SingleFlight, key: str, work, count: int = CALLERS) -> list:
+    callers = [Caller(lambda: flight.do(key, work)) for _ in range(count)]
+    for caller in callers:
+        caller.start()
+        # Leader first, so callers[0] owns the execution
+        wait_for_waiters(flight, key, callers.index(caller) + 1)
+    return callers
+
+def test_identical_calls_share_one_execution():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+    callers = start(flight, "key", slow_work(calls, release))
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert len(calls) == 1
+    assert [caller.result for caller in callers] == ["result"] * CALLERS
+
+def test_leader_disconnect_does_not_cancel_shared_work():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+    callers = start(flight, "key", slow_work(calls, release))
+    callers[0].token.cancel()
+    callers[1].token.cancel()
+    time.sleep(0.1)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert len(calls) == 1
+    # The leader's thread runs the work, so it still sees the result; the cancelled follower stops waiting
+    assert callers[0].result == "result"
+    assert isinstance(callers[1].error, RequestCancelled)
+    assert [caller.result for caller in callers[2:]] == ["result"] * (CALLERS - 2)
+
+def test_work_aborts_once_every_waiter_disconnects():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+    callers = start(flight, "key", slow_work(calls, release))
+    for caller in callers:
+        caller.token.cancel()
+    for caller in callers:
+        caller.join(5)
+    assert all(isinstance(caller.error, RequestCancelled) for caller in callers)
+    # The next request starts a fresh execution rather than joining the aborted one
+    release.set()
+    assert flight.do("key", slow_work(calls, release)) == "result"
+    assert len(calls) == 2
+
+def test_concurrent_identical_renders_share_one_graphviz_run(monkeypatch):
+    calls, release = [], threading.Event()
+
+    def run_graphviz(self, spec, options):
+        calls.append(1)
+        release.wait(5)
+        return b"\x89PNG shared"
+
+    monkeypatch.setattr(DiagramService, "_run_graphviz", run_graphviz)
+    spec = DiagramSpec.model_validate({
+        "diagram": {"name": f"Shared {uuid.uuid4()}"},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "Web"}]
+    })
+    callers = [Caller(lambda: DiagramService().render_image(spec, RenderOptions())) for _ in range(CALLERS)]
+    for caller in callers:
+        caller.start()
+    time.sleep(0.2)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert len(calls) == 1
+    assert [caller.result for caller in callers] == [b"\x89PNG shared"] * CALLERS
+
+def test_concurrent_identical_descriptions_share_one_generation(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "openrouter_api_key", "test-key")
+    monkeypatch.setattr(settings, "rule_fast_path_enabled", False)
+    calls, release = [], threading.Event()
+    spec = DiagramSpec.model_validate({
+        "diagram": {"name": "Generated"},
+        "nodes": [{"id": "web", "type": "aws.compute.EC2", "label": "Web"}]
+    })
+
+    def generate(self, description, route, timeout):
+        calls.append(1)
+        release.wait(5)
+        return spec
+
+    monkeypatch.setattr(LLMService, "_generate_with_llm", generate)
+    description = f"web server {uuid.uuid4()}"
+    callers = [Caller(lambda: LLMService().generate_diagram_spec(description)) for _ in range(CALLERS)]
+    for caller in callers:
+        caller.start()
+    time.sleep(0.2)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert len(calls) == 1
+    assert [caller.result for caller in callers] == [spec] * CALLERS
+
+def test_shared_error_reaches_every_caller():
+    flight, release, error = SingleFlight("test"), threading.Event(), ValueError("bad spec")
+
+    def failing():
+        release.wait(5)
+        raise error
+
+    callers = start(flight, "key", failing)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert all(caller.error is error for caller in callers)
@@ -0,0 +1,37 @@
+"""
+Tool catalog search, prompt tool selection and /tools ordering (no server needed)
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.endpoints import router
+from app.services.diagram_tools import DIAGRAM_TOOLS
+from app.services.tool_catalog import get_catalog, select_prompt_tools
+
+def test_prompt_tools_always_include_curated_core():
+    tools = select_prompt_tools("Simple web server with database", top_k=72)
+    assert set(DIAGRAM_TOOLS) <= set(tools)
+    assert "aws.compute.EC2" in tools
+    assert "aws.database.RDS" in tools
+    assert len(tools) == 72
+
+def test_prompt_tools_match_synonyms_and_specific_types():
+    tools = select_prompt_tools("kafka cluster with zookeeper and postgres", top_k=72)
+    assert set(DIAGRAM_TOOLS) <= set(tools)
+    assert "onprem.queue.Kafka" in tools
+    assert "onprem.network.Zookeeper" in tools
+    assert "onprem.database.Postgresql" in tools
+
+def test_search_synonyms_and_prefixes():
+    catalog = get_catalog()
+    assert "onprem.database.Postgresql" in [e["type"] for e in catalog.search("pg", limit=10)]
+    assert "onprem.database.Mongodb" in [e["type"] for e in catalog.search("mongo", limit=5)]
+    k8s = [e["type"] for e in catalog.search("k8s pod", limit=5)]
+    assert "k8s.compute.Pod" in k8s
+
+def test_tools_first_page_lists_curated_providers():
+    client = TestClient(FastAPI(routes=router.routes))
+    data = client.get("/tools").json()
+    first = list(data["tools"])[:len(DIAGRAM_TOOLS)]
+    assert set(first) == set(DIAGRAM_TOOLS)
+    for provider in ("aws", "gcp", "azure"):
+        assert data["by_provider"][provider]
@@ -0,0 +1,51 @@
+"""
+Readiness probe before, after and on a failed startup warm-up (no server or Graphviz needed)
+"""
+import threading
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import endpoints
+from app.api.endpoints import router
+from app.core.config import get_settings
+from app.services import warmup
+from app.services.diagram_service import DiagramService
+
+@pytest.fixture
+def fresh_warmup(monkeypatch):
+    status = {"steps": {}, "error": None, "duration_seconds": None}
+    monkeypatch.setattr(warmup, "_ready", threading.Event())
+    monkeypatch.setattr(warmup, "warmup_status", status)
+    monkeypatch.setattr(endpoints, "warmup_status", status)
+    monkeypatch.setattr(warmup, "prepare_icons", lambda: [])
+    settings = get_settings()
+    monkeypatch.setattr(settings, "render_backend", "local")
+    monkeypatch.setattr(settings, "openrouter_api_key", "")
+    return TestClient(FastAPI(routes=router.routes))
+
+def test_ready_after_warmup(fresh_warmup, monkeypatch):
+    rendered = []
+    monkeypatch.setattr(DiagramService, "render_image",
+                        lambda self, spec, options, use_cache=True: rendered.append(use_cache) or b"png")
+    response = fresh_warmup.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not ready"
+
+    warmup.run_warmup()
+    response = fresh_warmup.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert {"import_providers", "tool_catalog", "icon_assets", "render_sample"} <= set(body["steps"])
+    # The sample render bypasses the shared cache so this worker's Graphviz is primed
+    assert rendered == [False]
+
+def test_failed_warmup_stays_not_ready(fresh_warmup, monkeypatch):
+    def broken(self, spec, options, use_cache=True):
+        raise RuntimeError("dot not found")
+
+    monkeypatch.setattr(DiagramService, "render_image", broken)
+    warmup.run_warmup()
+    response = fresh_warmup.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["error"] == "dot not found"